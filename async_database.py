@@ -0,0 +1,461 @@
+"""
+asyncio counterpart of DatabaseConnection, built on mysql.connector.aio.
+
+AsyncDatabaseConnection mirrors the DatabaseConnection surface with coroutines,
+so queries never block the event loop. Connections come from a bounded pool per
+database; callers beyond the pool size wait for a free connection instead of failing.
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Union, Tuple
+
+from mysql.connector import Error, aio
+
+from database import DatabaseConfig, DatabaseConnection, _Transaction, _is_plain_read, _joins_key
+
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+logger = logging.getLogger(__name__)
+
+
+class AsyncConnectionPool:
+    """Opens up to `size` connections to one database on demand; acquire() waits when all are busy."""
+
+    def __init__(self, config: DatabaseConfig, database: Optional[str], size: int):
+        self.database = database
+        self.size = size
+        self._params = config.get_connection_params(database)
+        self._idle: List = []
+        self._slots = asyncio.Semaphore(size)
+        self.open_connections = 0
+
+    async def acquire(self):
+        await self._slots.acquire()
+        try:
+            while self._idle:
+                connection = self._idle.pop()
+                if await connection.is_connected():
+                    return connection
+                await self._discard(connection)
+            connection = await aio.connect(**self._params)
+            self.open_connections += 1
+            return connection
+        except BaseException:
+            self._slots.release()
+            raise
+
+    async def release(self, connection) -> None:
+        try:
+            if await connection.is_connected():
+                if connection.in_transaction:
+                    await connection.rollback()
+                self._idle.append(connection)
+            else:
+                await self._discard(connection)
+        except Error as err:
+            logger.warning(f"Discarding broken connection: {err}")
+            await self._discard(connection)
+        finally:
+            self._slots.release()
+
+    async def _discard(self, connection) -> None:
+        """Drops a dead or broken connection from the count, closing it so its socket is freed."""
+        self.open_connections -= 1
+        try:
+            await connection.close()
+        except Exception as err:
+            logger.debug(f"Ignoring error while closing discarded connection: {err}")
+
+    async def close(self) -> None:
+        while self._idle:
+            connection = self._idle.pop()
+            self.open_connections -= 1
+            await connection.close()
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines: concurrent awaits of the same key share one execution."""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]) -> Tuple[object, bool]:
+        """Returns (result, shared), where shared is True if another caller's execution was reused."""
+        task = self._calls.get(key)
+        if task is not None:
+            self.shared += 1
+            # Shielded: a cancelled caller must not cancel the query others are waiting on
+            return await asyncio.shield(task), True
+
+        # The query runs as its own task, so cancelling the caller that started it
+        # (e.g. a wait_for timeout) leaves it running for everyone else
+        task = self._calls[key] = asyncio.ensure_future(fn())
+        task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task), False
+
+    def _finished(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Mark retrieved: it's fine for every caller to have given up waiting
+            task.exception()
+
+
+class AsyncDatabaseConnection:
+    def __init__(self, pool_size: Optional[int] = None, single_flight: bool = False):
+        """
+        Args:
+            pool_size: connections per database; this bounds the queries in flight
+                       against one database. Defaults to DB_POOL_SIZE.
+            single_flight: identical plain SELECTs awaited concurrently outside a
+                       transaction share one execution.
+        """
+        self.config = DatabaseConfig()
+        self.pool_size = pool_size or self.config.pool_size
+        self.single_flight = AsyncSingleFlight() if single_flight else None
+        self._pools: Dict[Optional[str], AsyncConnectionPool] = {}
+        self._count_cache: Dict[Tuple, Tuple[float, int]] = {}
+        self._transaction: ContextVar[Optional[_Transaction]] = ContextVar(f"async_db_transaction_{id(self)}",
+                                                                           default=None)
+
+    def _get_pool(self, database: Optional[str] = None) -> AsyncConnectionPool:
+        db = database or self.config.database
+        pool = self._pools.get(db)
+        if pool is None:
+            pool = self._pools[db] = AsyncConnectionPool(self.config, db, self.pool_size)
+            logger.info(f"Async connection pool for '{db or 'server'}' created (size={self.pool_size})")
+        return pool
+
+    def _current_transaction(self, database: Optional[str] = None) -> Optional[_Transaction]:
+        """The active transaction() block, if a call for `database` should join it."""
+        tx = self._transaction.get()
+        if tx is None:
+            return None
+        if database is None or database == (tx.database or self.config.database):
+            return tx
+        return None
+
+    async def _commit(self, connection) -> None:
+        """Commit, unless the connection belongs to a transaction() block that commits on exit."""
+        tx = self._transaction.get()
+        if tx is None or tx.connection is not connection:
+            await connection.commit()
+
+    async def close(self) -> None:
+        """Close all idle pooled connections."""
+        for pool in self._pools.values():
+            await pool.close()
+
+    @asynccontextmanager
+    async def get_cursor(self, database=None, dictionary=False, buffered=None):
+        tx = self._current_transaction(database)
+        if tx is not None:
+            # Errors propagate to transaction(), which rolls back
+            cursor = await tx.connection.cursor(buffered=buffered, dictionary=dictionary)
+            try:
+                yield tx.connection, cursor
+            finally:
+                await cursor.close()
+            return
+
+        pool = self._get_pool(database)
+        connection = await pool.acquire()
+        cursor = None
+        try:
+            cursor = await connection.cursor(buffered=buffered, dictionary=dictionary)
+            yield connection, cursor
+        except Error as err:
+            logger.error(f"Database operation failed: {err}")
+            await connection.rollback()
+            raise
+        finally:
+            if cursor:
+                await cursor.close()
+            await pool.release(connection)
+
+    async def execute_query(self, query: str, params: Optional[Tuple] = None,
+                            database: Optional[str] = None, dictionary: bool = False,
+                            fetch: bool = True, return_lastrowid: bool = False) -> Union[List, int]:
+        if (fetch and self.single_flight is not None and _is_plain_read(query)
+                and not self._current_transaction(database)):
+            key = (database or self.config.database, query, params or (), dictionary)
+            try:
+                hash(key)
+            except TypeError:
+                key = None
+            if key is not None:
+                rows, shared = await self.single_flight.do(
+                    key, lambda: self._run_query(query, params, database, dictionary, fetch, return_lastrowid))
+                if shared:
+                    # Every caller gets its own rows to mutate
+                    return [dict(row) for row in rows] if dictionary else list(rows)
+                return rows
+        return await self._run_query(query, params, database, dictionary, fetch, return_lastrowid)
+
+    async def _run_query(self, query: str, params: Optional[Tuple], database: Optional[str], dictionary: bool,
+                         fetch: bool, return_lastrowid: bool) -> Union[List, int]:
+        async with self.get_cursor(database, dictionary) as (connection, cursor):
+            await cursor.execute(query, params or ())
+            if fetch:
+                results = await cursor.fetchall()
+                logger.debug(f"Query returned {len(results)} rows")
+                return results
+            else:
+                await self._commit(connection)
+                if return_lastrowid:
+                    return cursor.lastrowid
+                affected = cursor.rowcount
+                logger.debug(f"Query affected {affected} rows")
+                return affected
+
+    async def execute_many(self, query: str, param_list: List[Tuple], database: Optional[str] = None) -> int:
+        async with self.get_cursor(database) as (connection, cursor):
+            await cursor.executemany(query, param_list)
+            await self._commit(connection)
+            affected = cursor.rowcount
+            logger.debug(f"Batch query affected {affected} rows")
+            return affected
+
+    async def insert(self, table: str, data: Union[Dict, List[Dict]],
+                     database: Optional[str] = None, on_duplicate: Optional[str] = None) -> int:
+        """Insert one or many records. Returns last insert ID for single inserts, rowcount for batch."""
+        if isinstance(data, dict):
+            data = [data]
+        if not data:
+            return 0
+
+        query = DatabaseConnection._build_insert(table, tuple(data[0].keys()), on_duplicate)
+
+        if len(data) == 1:
+            return await self.execute_query(query, tuple(data[0].values()), database, fetch=False,
+                                            return_lastrowid=True)
+        else:
+            param_list = [tuple(record.values()) for record in data]
+            return await self.execute_many(query, param_list, database)
+
+    async def select(self, table: str, columns: str = "*", where: Optional[str] = None,
+                     params: Optional[List] = None, order_by: Optional[str] = None,
+                     limit: Optional[int] = None, offset: Optional[int] = None,
+                     database: Optional[str] = None, dictionary: bool = True,
+                     joins: Optional[Union[str, List[str]]] = None) -> List:
+        """Select records from a table. Arguments match DatabaseConnection.select()."""
+        query, query_params = DatabaseConnection._select_statement(table, columns, where, params, order_by,
+                                                                   limit, offset, joins)
+        return await self.execute_query(query, query_params, database, dictionary)
+
+    def iter_select(self, table: str, columns: str = "*", where: Optional[str] = None,
+                    params: Optional[List] = None, order_by: Optional[str] = None,
+                    limit: Optional[int] = None, offset: Optional[int] = None,
+                    database: Optional[str] = None, dictionary: bool = True,
+                    joins: Optional[Union[str, List[str]]] = None,
+                    batch_size: int = 1000) -> AsyncIterator:
+        """Same arguments as select(), but yields rows lazily via stream_query()."""
+        query, query_params = DatabaseConnection._select_statement(table, columns, where, params, order_by,
+                                                                   limit, offset, joins)
+        return self.stream_query(query, query_params, database, dictionary, batch_size)
+
+    async def stream_query(self, query: str, params: Optional[Tuple] = None,
+                           database: Optional[str] = None, dictionary: bool = False,
+                           batch_size: int = 1000) -> AsyncIterator:
+        """
+        Async-iterate rows from an unbuffered cursor, fetching batch_size rows at a time.
+
+        The connection goes back to the pool when the rows are exhausted or the
+        iterator is closed (aclose(), or breaking out of `async for`).
+        """
+        async with self.get_cursor(database, dictionary, buffered=False) as (connection, cursor):
+            await cursor.execute(query, params or ())
+            try:
+                while True:
+                    rows = await cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield row
+            finally:
+                await self._abandon_result(connection)
+
+    async def _abandon_result(self, connection) -> None:
+        """Stop a part-read unbuffered result with KILL QUERY; see DatabaseConnection._abandon_result()."""
+        if not connection.unread_result:
+            return
+        try:
+            killer = await aio.connect(**self.config.get_connection_params(
+                None, connection.server_host, connection.server_port))
+            try:
+                await killer.cmd_query(f"KILL QUERY {connection.connection_id}")
+            finally:
+                await killer.close()
+        except Error as err:
+            logger.warning(f"Could not stop abandoned query on connection {connection.connection_id}: {err}")
+        try:
+            await connection.consume_results()
+        except Error as err:
+            # A killed statement ends its result with ER_QUERY_INTERRUPTED
+            logger.debug(f"Abandoned result ended with: {err}")
+
+    async def update(self, table: str, data: Dict, where: str,
+                     params: Optional[List] = None, database: Optional[str] = None) -> int:
+        query = DatabaseConnection._build_update(table, tuple(data.keys()), where)
+        query_params = list(data.values()) + (params or [])
+        return await self.execute_query(query, tuple(query_params), database, fetch=False)
+
+    async def delete(self, table: str, where: str, params: Optional[List] = None,
+                     database: Optional[str] = None, soft: bool = False) -> int:
+        query = DatabaseConnection._build_delete(table, where, soft)
+        return await self.execute_query(query, tuple(params or []), database, fetch=False)
+
+    async def exists(self, table: str, where: str, params: Optional[List] = None,
+                     database: Optional[str] = None) -> bool:
+        query = DatabaseConnection._build_exists(table, where)
+        result = await self.execute_query(query, tuple(params or []), database)
+        return len(result) > 0
+
+    async def count(self, table: str, where: Optional[str] = None,
+                    params: Optional[List] = None, database: Optional[str] = None) -> int:
+        query = DatabaseConnection._build_count(table, where)
+        result = await self.execute_query(query, tuple(params or []), database)
+        return result[0][0]
+
+    async def upsert(self, table: str, data: Dict, update_fields: Optional[List[str]] = None,
+                     database: Optional[str] = None) -> int:
+        fields = tuple(update_fields) if update_fields else tuple(data.keys())
+        on_duplicate = DatabaseConnection._upsert_clause(fields)
+        return await self.insert(table, data, database, on_duplicate=on_duplicate)
+
+    @asynccontextmanager
+    async def transaction(self, database: Optional[str] = None):
+        """
+        Async context manager for explicit transactions. Yields the connection object.
+
+        Methods awaited inside the block from the same task run on this connection
+        and are committed once, on exit. Nested transaction() calls join the outer one.
+        """
+        outer = self._current_transaction(database)
+        if outer is not None:
+            yield outer.connection
+            return
+
+        pool = self._get_pool(database)
+        connection = await pool.acquire()
+        token = self._transaction.set(_Transaction(connection, database))
+        try:
+            await connection.start_transaction()
+            yield connection
+            await connection.commit()
+            logger.debug("Transaction committed")
+        except BaseException as err:
+            await connection.rollback()
+            logger.error(f"Transaction rolled back: {err}")
+            raise
+        finally:
+            self._transaction.reset(token)
+            await pool.release(connection)
+
+    async def batch_update(self, table: str, updates: List[Dict], key_field: str,
+                           database: Optional[str] = None, chunk_size: int = 500) -> int:
+        """Grouped CASE updates in one transaction. Arguments match DatabaseConnection.batch_update()."""
+        if not updates:
+            return 0
+        if chunk_size < 1:
+            raise ValueError(f"chunk_size must be positive, got {chunk_size}")
+
+        groups = DatabaseConnection._group_updates(updates, key_field)
+
+        total_affected = 0
+        async with self.transaction(database) as connection:
+            cursor = await connection.cursor()
+            try:
+                for columns, rows in groups.items():
+                    keys = list(rows)
+                    for start in range(0, len(keys), chunk_size):
+                        chunk = keys[start:start + chunk_size]
+                        query, query_params = DatabaseConnection._build_batch_update(
+                            table, key_field, columns, chunk, rows)
+                        await cursor.execute(query, query_params)
+                        total_affected += cursor.rowcount
+            finally:
+                await cursor.close()
+
+        logger.debug(f"Batch update affected {total_affected} rows")
+        return total_affected
+
+    async def paginate(self, table: str, page: int = 1, per_page: int = 10,
+                       columns: str = "*", where: Optional[str] = None,
+                       params: Optional[List] = None, order_by: Optional[str] = None,
+                       database: Optional[str] = None,
+                       joins: Optional[Union[str, List[str]]] = None,
+                       total: str = 'exact', total_ttl: float = 60.0) -> Dict:
+        """
+        Returns a page of results along with pagination metadata; see DatabaseConnection.paginate().
+        With total="exact" the count and the page query always run concurrently.
+        """
+        if total not in DatabaseConnection.PAGINATE_TOTALS:
+            raise ValueError(f"total must be one of {DatabaseConnection.PAGINATE_TOTALS}, got {total!r}")
+
+        offset = (page - 1) * per_page
+        if total == 'exact':
+            count_query = self.count(table, where, params, database)
+            page_query = self.select(table, columns, where, params, order_by, per_page, offset, database, joins=joins)
+            if self._current_transaction(database):
+                # Both would share the transaction's connection, which runs one statement at a time
+                row_count = await count_query
+                records = await page_query
+            else:
+                row_count, records = await asyncio.gather(count_query, page_query)
+            has_next = page * per_page < row_count
+            total_source = 'exact'
+        else:
+            records = await self.select(table, columns, where, params, order_by, per_page + 1, offset,
+                                        database, joins=joins)
+            has_next = len(records) > per_page
+            records = records[:per_page]
+            if total == 'none':
+                row_count, total_source = None, 'none'
+            elif total == 'estimate':
+                row_count, total_source = await self._estimate_count(table, where, params, database, joins), 'estimate'
+            else:
+                row_count, total_source = await self._cached_count(table, where, params, database, total_ttl)
+
+        return {
+            'data': records,
+            'pagination': {
+                'page': page,
+                'per_page': per_page,
+                'total': row_count,
+                'pages': None if row_count is None else (row_count + per_page - 1) // per_page,
+                'has_next': has_next,
+                'has_prev': page > 1,
+                'total_source': total_source,
+            }
+        }
+
+    async def _estimate_count(self, table: str, where: Optional[str] = None,
+                              params: Optional[List] = None, database: Optional[str] = None,
+                              joins: Optional[Union[str, List[str]]] = None) -> int:
+        """Row estimate without scanning; see DatabaseConnection._estimate_count()."""
+        if not where and not joins:
+            query, query_params = DatabaseConnection._table_rows_statement(table, database or self.config.database)
+            result = await self.execute_query(query, query_params, database)
+            if result and result[0][0] is not None:
+                return int(result[0][0])
+
+        plan = await self.execute_query(DatabaseConnection._explain_count_statement(table, where, _joins_key(joins)),
+                                        tuple(params or []), database, dictionary=True)
+        return DatabaseConnection._estimate_from_plan(plan)
+
+    async def _cached_count(self, table: str, where: Optional[str], params: Optional[List],
+                            database: Optional[str], ttl: float) -> Tuple[int, str]:
+        key = (database or self.config.database, table, where, tuple(params or []))
+        now = time.monotonic()
+        entry = self._count_cache.get(key)
+        if entry and entry[0] > now:
+            return entry[1], 'cache'
+
+        row_count = await self.count(table, where, params, database)
+        self._count_cache = {k: v for k, v in self._count_cache.items() if v[0] > now}
+        self._count_cache[key] = (now + ttl, row_count)
+        return row_count, 'exact'
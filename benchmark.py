@@ -0,0 +1,158 @@
+"""
+Benchmarks: times optimized DatabaseConnection code paths against their baselines
+on a live MySQL server. Requires the same .env file as main.py.
+"""
+import logging
+import datetime
+import statistics
+import time
+import tracemalloc
+from database import DatabaseConnection
+from instrumentation import QueryMetrics
+from records import make_records
+
+logging.basicConfig(level=logging.WARNING, format='%(levelname)s: %(message)s')
+
+BENCH_DB = 'bench_db'
+BENCH_TABLE = 'bench_users'
+ROWS = 200_000
+ROUNDS = 20
+
+
+def timed(fn, rounds=ROUNDS):
+    """Returns the median wall time of fn() in milliseconds."""
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def report(label, baseline_ms, optimized_ms):
+    print(f"{label:<40} baseline {baseline_ms:8.2f} ms   optimized {optimized_ms:8.2f} ms   "
+          f"({baseline_ms / optimized_ms:.2f}x)")
+
+
+def setup(db):
+    db.create_database(BENCH_DB)
+    db.drop_table(BENCH_TABLE, database=BENCH_DB)
+    db.create_table(
+        BENCH_TABLE,
+        columns={
+            'id': 'INT AUTO_INCREMENT PRIMARY KEY',
+            'name': 'VARCHAR(100) NOT NULL',
+            'email': 'VARCHAR(150) NOT NULL',
+            'created_at': 'DATETIME DEFAULT CURRENT_TIMESTAMP',
+            'deleted_at': 'DATETIME DEFAULT NULL',
+        },
+        database=BENCH_DB,
+    )
+    batch = 5_000
+    for start in range(0, ROWS, batch):
+        db.insert(BENCH_TABLE, [
+            {'name': f'user{i}', 'email': f'user{i}@example.com'}
+            for i in range(start, start + batch)
+        ], database=BENCH_DB)
+
+
+def bench_paginate_parallel(db):
+    def page(parallel):
+        return lambda: db.paginate(BENCH_TABLE, page=50, per_page=20, where='deleted_at IS NULL',
+                                   order_by='id', database=BENCH_DB, parallel=parallel)
+
+    report("paginate: sequential vs parallel count", timed(page(False)), timed(page(True)))
+
+
+def bench_statement_builders(calls=100_000):
+    """Memoized vs raw SQL builders; no server needed."""
+    select = DatabaseConnection._build_select
+    insert = DatabaseConnection._build_insert
+    columns = ('name', 'email', 'created_at')
+    joins = ('JOIN orders o ON u.id = o.user_id', 'LEFT JOIN products p ON o.product_id = p.id')
+
+    def build(select_fn, insert_fn):
+        def run():
+            for _ in range(calls):
+                select_fn('users u', 'u.id, u.name', 'u.deleted_at IS NULL AND u.id = %s',
+                          'u.created_at DESC', True, True, joins)
+                insert_fn(BENCH_TABLE, columns, None, 1)
+        return run
+
+    report(f"SQL builders: raw vs memoized ({calls} calls)",
+           timed(build(select.__wrapped__, insert.__wrapped__), rounds=5),
+           timed(build(select, insert), rounds=5))
+
+
+def allocated_mb(fn):
+    """Returns the memory held by fn()'s result in MB."""
+    tracemalloc.start()
+    try:
+        result = fn()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return size / 1024 / 1024
+
+
+def bench_row_factories(rows=ROWS):
+    """Dict rows vs tuple-backed records built from the same fetched tuples; no server needed."""
+    columns = ('id', 'name', 'email', 'created_at', 'deleted_at')
+    description = [(name,) for name in columns]
+    created = datetime.datetime(2024, 1, 1)
+    fetched = [(i, f'user{i}', f'user{i}@example.com', created, None) for i in range(rows)]
+
+    def dicts():
+        return [dict(zip(columns, row)) for row in fetched]
+
+    def records():
+        return make_records(description, fetched)
+
+    report(f"Rows: dict vs record build ({rows})", timed(dicts, rounds=5), timed(records, rounds=5))
+    dict_mb, record_mb = allocated_mb(dicts), allocated_mb(records)
+    print(f"{'Rows: dict vs record memory':<40} baseline {dict_mb:8.2f} MB   optimized {record_mb:8.2f} MB   "
+          f"({dict_mb / record_mb:.2f}x)")
+
+
+def bench_select_row_factory(db, records_db):
+    def fetch(connection):
+        return lambda: connection.select(BENCH_TABLE, database=BENCH_DB)
+
+    report(f"select {ROWS} rows: dict vs record", timed(fetch(db), rounds=5), timed(fetch(records_db), rounds=5))
+
+
+def bench_instrumentation_overhead(calls=100_000):
+    """Cost the hooks add to one query with the QueryMetrics collector enabled; no server needed."""
+    db = DatabaseConnection(use_pool=False)
+    db.add_hook(QueryMetrics())
+    query = DatabaseConnection._build_select(BENCH_TABLE, '*', 'id = %s')
+    rows = [{'id': 1, 'name': 'user1', 'email': 'user1@example.com'}]
+
+    start = time.perf_counter()
+    for i in range(calls):
+        event = db._before_execute(query, (i,), BENCH_DB)
+        event.wait, event.rows, event.result = 0.00001, 1, rows
+        db._after_execute(event)
+    per_query_us = (time.perf_counter() - start) / calls * 1_000_000
+    print(f"{'Instrumentation overhead per query':<40} {per_query_us:8.2f} us")
+
+
+def run_benchmarks():
+    bench_statement_builders()
+    bench_row_factories()
+    bench_instrumentation_overhead()
+
+    db = DatabaseConnection()
+    print(f"Preparing {ROWS} rows in {BENCH_DB}.{BENCH_TABLE} ...")
+    setup(db)
+    try:
+        bench_paginate_parallel(db)
+        bench_select_row_factory(db, DatabaseConnection(row_factory='record'))
+    finally:
+        db.drop_table(BENCH_TABLE, database=BENCH_DB)
+        db.close()
+
+
+if __name__ == '__main__':
+    run_benchmarks()
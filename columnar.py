@@ -0,0 +1,113 @@
+"""
+Column-oriented query results backed by NumPy arrays.
+
+Rows are fetched in fetchmany() batches and appended column by column to typed
+arrays, so no per-row dict is ever built: numbers become int64/uint64/float64
+arrays, dates and datetimes datetime64, TIME timedelta64, and everything else
+(strings, bytes, JSON) an object array. Every column has a boolean null mask.
+
+NumPy is optional: install it to use DatabaseConnection.select_columnar().
+"""
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+from mysql.connector.constants import FieldFlag, FieldType
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_INTEGER_TYPES = {FieldType.TINY, FieldType.SHORT, FieldType.INT24, FieldType.LONG,
+                  FieldType.LONGLONG, FieldType.YEAR}
+# DECIMAL is widened to float64: analytics want vectorized math more than exact digits
+_FLOAT_TYPES = {FieldType.FLOAT, FieldType.DOUBLE, FieldType.DECIMAL, FieldType.NEWDECIMAL}
+_DATETIME_TYPES = {FieldType.DATETIME, FieldType.TIMESTAMP}
+_DATE_TYPES = {FieldType.DATE, FieldType.NEWDATE}
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise ImportError("select_columnar() needs NumPy: pip install numpy")
+
+
+def _column_dtype(column: Sequence) -> str:
+    """NumPy dtype for one cursor.description entry."""
+    type_code = column[1]
+    flags = column[7] if len(column) > 7 else 0
+    if type_code in _INTEGER_TYPES:
+        return 'uint64' if type_code == FieldType.LONGLONG and flags & FieldFlag.UNSIGNED else 'int64'
+    if type_code in _FLOAT_TYPES:
+        return 'float64'
+    if type_code in _DATETIME_TYPES:
+        return 'datetime64[us]'
+    if type_code in _DATE_TYPES:
+        return 'datetime64[D]'
+    if type_code == FieldType.TIME:
+        return 'timedelta64[us]'
+    return 'object'
+
+
+class ColumnarResult:
+    """
+    Query result as {column name: array}, plus a null mask per column.
+
+    result["amount"].sum(), result.masked("amount").mean() (nulls excluded), len(result).
+    Null slots hold 0 / NaT / None in the value arrays; the masks say which they are.
+    """
+
+    def __init__(self, columns: Dict, nulls: Dict):
+        self.columns = columns
+        self.nulls = nulls
+
+    def __getitem__(self, name: str):
+        return self.columns[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.columns
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def keys(self) -> List[str]:
+        return list(self.columns)
+
+    def masked(self, name: str):
+        """The column as a numpy.ma.MaskedArray, so reductions skip NULLs."""
+        return np.ma.MaskedArray(self.columns[name], mask=self.nulls[name])
+
+
+def _convert_chunk(values: Tuple, dtype: str):
+    """(value array, null mask) for one batch of one column."""
+    mask = np.fromiter((value is None for value in values), dtype=bool, count=len(values))
+    if dtype == 'object':
+        array = np.empty(len(values), dtype=object)
+        array[:] = values
+        return array, mask
+    if mask.any():
+        # datetime64/timedelta64 turn None into NaT by themselves
+        if not dtype.startswith(('datetime64', 'timedelta64')):
+            values = tuple(0 if value is None else value for value in values)
+    if dtype in ('int64', 'uint64', 'float64'):
+        return np.fromiter(values, dtype=dtype, count=len(values)), mask
+    return np.array(values, dtype=dtype), mask
+
+
+def build_columnar(description: Sequence[Sequence], batches: Iterator[List[Tuple]]) -> ColumnarResult:
+    """Assemble a ColumnarResult from tuple-row batches and the cursor description."""
+    _require_numpy()
+    names = [column[0] for column in description]
+    dtypes = [_column_dtype(column) for column in description]
+    chunks: List[List] = [[] for _ in names]
+    masks: List[List] = [[] for _ in names]
+
+    for rows in batches:
+        for index, values in enumerate(zip(*rows)):
+            array, mask = _convert_chunk(values, dtypes[index])
+            chunks[index].append(array)
+            masks[index].append(mask)
+
+    columns, nulls = {}, {}
+    for name, dtype, column_chunks, column_masks in zip(names, dtypes, chunks, masks):
+        columns[name] = np.concatenate(column_chunks) if column_chunks else np.empty(0, dtype=dtype)
+        nulls[name] = np.concatenate(column_masks) if column_masks else np.empty(0, dtype=bool)
+    return ColumnarResult(columns, nulls)
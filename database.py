@@ -1,10 +1,28 @@
 import mysql.connector
-from mysql.connector import Error, pooling
+from mysql.connector import Error, errorcode, pooling
+import base64
+import datetime
+import decimal
+import json
 import os
+import queue
+import re
+import shutil
+import tempfile
 from dotenv import load_dotenv
+from instrumentation import QueryEvent, QueryHook, QueryMetrics
+from nplusone import DetectionScope, NPlusOneDetector
+from records import make_records
+from slowlog import SlowQueryLog
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from collections import OrderedDict
 from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from functools import lru_cache
 import logging
-from typing import Dict, List, Optional, Union, Tuple
+import threading
+import time
+from typing import Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Sequence, Union, Tuple
 
 # Library best practice: don't configure logging, let the caller decide
 logging.getLogger(__name__).addHandler(logging.NullHandler())
@@ -16,53 +34,985 @@ load_dotenv()
 class DatabaseConfig:
     def __init__(self):
         self.host = os.getenv('DB_HOST')
+        self.port: Optional[int] = None
         self.user = os.getenv('DB_USER')
         self.password = os.getenv('DB_PASSWORD')
         self.database = os.getenv('DB_NAME', None)
         self.pool_size = int(os.getenv('DB_POOL_SIZE', '5'))
+        self.max_connections = int(os.getenv('DB_MAX_CONNECTIONS', '50'))
+        self.replica_hosts = self._parse_hosts(os.getenv('DB_REPLICA_HOSTS', ''))
+        self.replica_strategy = os.getenv('DB_REPLICA_STRATEGY', 'round_robin')
+        self.read_sticky_seconds = float(os.getenv('DB_READ_STICKY_SECONDS', '0'))
+        max_lag = os.getenv('DB_REPLICA_MAX_LAG')
+        self.replica_max_lag = float(max_lag) if max_lag else None
+        self.replica_lag_check_interval = float(os.getenv('DB_REPLICA_LAG_CHECK_INTERVAL', '1.0'))
+        self.track_gtids = os.getenv('DB_TRACK_GTIDS', '').lower() in ('1', 'true', 'yes')
+        self.gtid_wait_timeout = float(os.getenv('DB_GTID_WAIT_TIMEOUT', '0.5'))
+        slow_query_seconds = os.getenv('DB_SLOW_QUERY_SECONDS')
+        self.slow_query_seconds = float(slow_query_seconds) if slow_query_seconds else None
+        self.slow_query_log = os.getenv('DB_SLOW_QUERY_LOG') or None
+        self.n_plus_one_threshold = int(os.getenv('DB_N_PLUS_ONE_THRESHOLD', '5'))
+        self.n_plus_one_raise = os.getenv('DB_N_PLUS_ONE_RAISE', '').lower() in ('1', 'true', 'yes')
+        self.shard_hosts = [(host, port) for host, port, _ in self._parse_hosts(os.getenv('DB_SHARD_HOSTS', ''))]
 
         required = {'DB_HOST': self.host, 'DB_USER': self.user, 'DB_PASSWORD': self.password}
         missing = [k for k, v in required.items() if not v]
         if missing:
             raise ValueError(f"Missing required environment variables: {', '.join(missing)}")
 
-    def get_connection_params(self, database=None) -> Dict:
+    @staticmethod
+    def _parse_hosts(value: str) -> List[Tuple[str, Optional[int], int]]:
+        """Parse "replica1:3306*2, replica2" into [(host, port, weight), ...]."""
+        hosts = []
+        for entry in filter(None, (part.strip() for part in value.split(','))):
+            address, _, weight = entry.partition('*')
+            host, _, port = address.partition(':')
+            hosts.append((host, int(port) if port else None, int(weight) if weight else 1))
+        return hosts
+
+    def get_connection_params(self, database=None, host: Optional[str] = None,
+                              port: Optional[int] = None) -> Dict:
         params = {
-            'host': self.host,
+            'host': host or self.host,
             'user': self.user,
             'password': self.password,
             'autocommit': False,
             'charset': 'utf8mb4',
         }
+        if port or self.port:
+            params['port'] = port or self.port
         db = database or self.database
         if db:
             params['database'] = db
         return params
 
 
-class DatabaseConnection:
-    def __init__(self, use_pool: bool = True):
-        self.config = DatabaseConfig()
-        self._pool = None
+class ConnectionPoolRegistry:
+    """
+    Lazily creates one connection pool per database name.
+
+    Every pool counts its connections against max_connections; once the cap is
+    reached no new pools are created and callers fall back to direct connections.
+    A pool that fails to be created is not retried for POOL_RETRY_SECONDS.
+    """
+    POOL_RETRY_SECONDS = 30.0
+
+    def __init__(self, config: DatabaseConfig, pool_sizes: Optional[Dict[str, int]] = None,
+                 host: Optional[str] = None, port: Optional[int] = None, reset_session: bool = True):
+        """
+        host/port point the pools at another server (a replica) with the same credentials.
+        reset_session=False keeps session state, including prepared statements, across checkouts.
+        """
+        self.config = config
+        self.host = host
+        self.port = port
+        self.reset_session = reset_session
+        self.pool_sizes = dict(pool_sizes or {})
+        self.max_connections = config.max_connections
+        self._pools: Dict[str, pooling.MySQLConnectionPool] = {}
+        # database -> monotonic time before which a failed pool creation is not retried
+        self._failed: Dict[str, float] = {}
+        self._lock = threading.Lock()
 
-        if use_pool and self.config.database:
+    def get_pool(self, database: str) -> Optional[pooling.MySQLConnectionPool]:
+        pool = self._pools.get(database)
+        if pool is not None:
+            return pool
+
+        if self._failed.get(database, 0.0) > time.monotonic():
+            return None
+
+        with self._lock:
+            pool = self._pools.get(database)
+            if pool is not None:
+                return pool
+
+            size = min(self.pool_sizes.get(database, self.config.pool_size),
+                       self.max_connections - self.connection_count())
+            if size < 1:
+                logger.debug(f"Connection cap ({self.max_connections}) reached, no pool for '{database}'")
+                return None
             try:
-                self._pool = pooling.MySQLConnectionPool(
-                    pool_name="db_pool",
-                    pool_size=self.config.pool_size,
-                    **self.config.get_connection_params(),
+                pool = pooling.MySQLConnectionPool(
+                    pool_name=f"db_pool_{len(self._pools)}",
+                    pool_size=size,
+                    pool_reset_session=self.reset_session,
+                    **self.config.get_connection_params(database, self.host, self.port),
                 )
-                logger.info(f"Connection pool created (size={self.config.pool_size})")
             except Error as err:
-                logger.warning(f"Could not create connection pool: {err}. Using direct connections.")
+                self._failed[database] = time.monotonic() + self.POOL_RETRY_SECONDS
+                logger.warning(f"Could not create connection pool for '{database}': {err}. "
+                               f"Using direct connections for {self.POOL_RETRY_SECONDS:g}s.")
+                return None
+            self._failed.pop(database, None)
+            self._pools[database] = pool
+            logger.info(f"Connection pool for '{database}' created (size={size})")
+            return pool
 
-    def _create_connection(self, database=None) -> mysql.connector.MySQLConnection:
-        # Use pool only when no override database is specified
-        if self._pool and not database:
+    def get_connection(self, database: str) -> Optional[mysql.connector.MySQLConnection]:
+        """Returns a pooled connection, or None if no pool is available or it is exhausted."""
+        pool = self.get_pool(database)
+        if pool is None:
+            return None
+        try:
+            return pool.get_connection()
+        except Error:
+            return None
+
+    def connection_count(self) -> int:
+        return sum(pool.pool_size for pool in self._pools.values())
+
+    def stats(self) -> Dict:
+        return {
+            'pools': len(self._pools),
+            'connections': self.connection_count(),
+            'max_connections': self.max_connections,
+            'by_database': {name: pool.pool_size for name, pool in self._pools.items()},
+        }
+
+
+class Replica:
+    """One read replica: its address, routing weight and connection pools."""
+
+    def __init__(self, host: str, port: Optional[int], weight: int,
+                 pools: Optional[ConnectionPoolRegistry] = None):
+        self.host = host
+        self.port = port
+        self.weight = max(weight, 1)
+        self.pools = pools
+        self.outstanding = 0
+        self.current_weight = 0
+        # Filled in by ReplicaMonitor; lag is None until known, or while replication is stopped
+        self.lag: Optional[float] = None
+        self.gtid_executed: Optional[str] = None
+        # Last session GTID set this replica was confirmed to have applied
+        self.confirmed_gtid: Optional[str] = None
+        # Set by ReplicaRouter.mark_down(): no reads before down_until (monotonic time)
+        self.failures = 0
+        self.down_until = 0.0
+
+    @property
+    def name(self) -> str:
+        return f"{self.host}:{self.port}" if self.port else self.host
+
+
+class ReplicaRouter:
+    """
+    Picks a replica per read, by smooth weighted round-robin or by fewest
+    outstanding requests per unit of weight. choose() and release() bracket a read.
+    A replica that can't be reached is skipped for a backoff that doubles with
+    each consecutive failure, from RETRY_BASE up to RETRY_MAX seconds.
+    """
+
+    STRATEGIES = ('round_robin', 'least_outstanding')
+    RETRY_BASE = 1.0
+    RETRY_MAX = 60.0
+
+    def __init__(self, replicas: List[Replica], strategy: str = 'round_robin',
+                 max_lag: Optional[float] = None):
+        """
+        Args:
+            max_lag: skip replicas more than this many seconds behind the source,
+                     or whose lag is unknown. None disables lag-aware routing.
+        """
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"strategy must be one of {self.STRATEGIES}, got {strategy!r}")
+        self.replicas = replicas
+        self.strategy = strategy
+        self.max_lag = max_lag
+        self._lock = threading.Lock()
+
+    def choose(self) -> Optional[Replica]:
+        now = time.monotonic()
+        with self._lock:
+            candidates = [r for r in self.replicas
+                          if r.down_until <= now
+                          and (self.max_lag is None or (r.lag is not None and r.lag <= self.max_lag))]
+            if not candidates:
+                return None
+            if self.strategy == 'least_outstanding':
+                replica = min(candidates, key=lambda r: r.outstanding / r.weight)
+            else:
+                total = sum(r.weight for r in candidates)
+                for r in candidates:
+                    r.current_weight += r.weight
+                replica = max(candidates, key=lambda r: r.current_weight)
+                replica.current_weight -= total
+            replica.outstanding += 1
+            return replica
+
+    def release(self, replica: Replica) -> None:
+        with self._lock:
+            replica.outstanding -= 1
+
+    def mark_down(self, replica: Replica) -> None:
+        """Stop routing to a replica that failed to connect, with exponential backoff."""
+        with self._lock:
+            replica.failures += 1
+            backoff = min(self.RETRY_BASE * 2 ** (replica.failures - 1), self.RETRY_MAX)
+            replica.down_until = time.monotonic() + backoff
+        logger.warning(f"Replica {replica.name} marked down for {backoff:g}s")
+
+    def mark_up(self, replica: Replica) -> None:
+        if replica.failures:
+            with self._lock:
+                replica.failures = 0
+                replica.down_until = 0.0
+            logger.info(f"Replica {replica.name} is reachable again")
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        return {
+            'strategy': self.strategy,
+            'max_lag': self.max_lag,
+            'replicas': {r.name: {'weight': r.weight, 'outstanding': r.outstanding, 'lag': r.lag,
+                                  'down_for': max(r.down_until - now, 0.0)}
+                         for r in self.replicas},
+        }
+
+
+class ReplicaMonitor:
+    """
+    Background thread that polls each replica's replication lag and executed GTID
+    set every `interval` seconds. refresh() runs one poll synchronously; it is safe
+    to call while the thread runs, and with interval <= 0 start() runs no thread,
+    so tests can drive every poll themselves.
+    """
+
+    def __init__(self, config: DatabaseConfig, replicas: List[Replica], interval: float = 1.0):
+        self.config = config
+        self.replicas = replicas
+        self.interval = interval
+        self._connections: Dict[str, mysql.connector.MySQLConnection] = {}
+        # One poll at a time: the thread and callers of refresh() share the connections
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name="db_replica_monitor", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._refresh_lock:
+            for connection in self._connections.values():
+                connection.close()
+            self._connections.clear()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.interval)
+
+    def refresh(self) -> None:
+        with self._refresh_lock:
+            self._refresh()
+
+    def _refresh(self) -> None:
+        for replica in self.replicas:
             try:
-                return self._pool.get_connection()
+                replica.lag, replica.gtid_executed = self._check(replica)
+            except Error as err:
+                logger.warning(f"Could not check replica {replica.name}: {err}")
+                replica.lag = None
+                stale = self._connections.pop(replica.name, None)
+                if stale is not None:
+                    stale.close()
+
+    def _check(self, replica: Replica) -> Tuple[Optional[float], Optional[str]]:
+        connection = self._connections.get(replica.name)
+        if connection is None or not connection.is_connected():
+            params = self.config.get_connection_params(None, replica.host, replica.port)
+            params.pop('database', None)
+            params['autocommit'] = True
+            connection = self._connections[replica.name] = mysql.connector.connect(**params)
+
+        cursor = connection.cursor(dictionary=True)
+        try:
+            try:
+                cursor.execute("SHOW REPLICA STATUS")
             except Error:
-                pass  # fall through to direct connection
+                # Servers before 8.0.22 only know the old spelling
+                cursor.execute("SHOW SLAVE STATUS")
+            status = cursor.fetchall()
+            cursor.execute("SELECT @@GLOBAL.gtid_executed AS gtid_executed")
+            gtid_executed = cursor.fetchall()[0]['gtid_executed']
+        finally:
+            cursor.close()
+
+        if not status:
+            return None, gtid_executed
+        lag = status[0].get('Seconds_Behind_Source', status[0].get('Seconds_Behind_Master'))
+        return (float(lag) if lag is not None else None), gtid_executed
+
+
+_JOIN_TABLE = re.compile(r'\bJOIN\s+([\w.`]+)', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+# Generated SQL is memoized by call shape (table, columns, clause templates), never by values
+_STATEMENT_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=_STATEMENT_CACHE_SIZE)
+def _table_names(table: str, joins: Optional[Union[str, Tuple[str, ...]]] = None) -> Tuple[str, ...]:
+    """Bare, lower-cased table names referenced by a table argument ("users u") and its JOIN clauses."""
+    names = [table.split()[0]]
+    if joins:
+        for clause in (joins if isinstance(joins, tuple) else [joins]):
+            names.extend(_JOIN_TABLE.findall(clause))
+    return tuple(name.replace('`', '').lower() for name in names)
+
+
+class QueryCache:
+    """
+    Bounded LRU of read results with a per-entry TTL.
+
+    Entries are indexed by the tables they read so a write can drop every
+    cached result for a table. Each table carries a generation counter: a read
+    that raced with a write to one of its tables is not stored.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 30.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._by_table: Dict[str, set] = {}
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(query: str, params: Tuple, database: Optional[str], dictionary: bool) -> Tuple:
+        return database, _WHITESPACE.sub(' ', query).strip(), params, dictionary
+
+    def get(self, key: Tuple):
+        """Returns the cached rows, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    self._discard(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def snapshot(self, tables: List[str]) -> Tuple:
+        with self._lock:
+            return tuple(self._generations.get(table, 0) for table in tables)
+
+    def put(self, key: Tuple, tables: List[str], rows: List, snapshot: Tuple) -> None:
+        with self._lock:
+            if snapshot != tuple(self._generations.get(table, 0) for table in tables):
+                return
+            self._discard(key)
+            self._entries[key] = (time.monotonic() + self.ttl, rows, tables)
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, table: str) -> None:
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+            keys = self._by_table.pop(table, ())
+            for key in list(keys):
+                self._discard(key)
+            self.invalidations += len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            for table in self._by_table:
+                self._generations[table] = self._generations.get(table, 0) + 1
+            self._entries.clear()
+            self._by_table.clear()
+
+    def _discard(self, key: Tuple) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            for table in entry[2]:
+                keys = self._by_table.get(table)
+                if keys is not None:
+                    keys.discard(key)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+# Errors meaning LOAD DATA LOCAL is refused by the server or the client library
+_LOCAL_INFILE_ERRORS = {
+    errorcode.ER_NOT_ALLOWED_COMMAND,
+    errorcode.ER_CLIENT_LOCAL_FILES_DISABLED,
+    errorcode.CR_LOAD_DATA_LOCAL_INFILE_REJECTED,
+}
+_TSV_SPECIAL = re.compile(rb'[\\\t\n\r\x00]')
+_TSV_REPLACEMENTS = {b'\\': b'\\\\', b'\t': b'\\t', b'\n': b'\\n', b'\r': b'\\r', b'\x00': b'\\0'}
+
+
+def _tsv_field(value) -> bytes:
+    """Encode one value for LOAD DATA's default format (tab-separated, backslash-escaped)."""
+    if value is None:
+        return b'\\N'
+    if isinstance(value, bool):
+        return b'1' if value else b'0'
+    if isinstance(value, (bytes, bytearray)):
+        raw = bytes(value)
+    elif isinstance(value, datetime.datetime):
+        raw = value.isoformat(sep=' ').encode()
+    elif isinstance(value, datetime.timedelta):
+        seconds = int(value.total_seconds())
+        sign = '-' if seconds < 0 else ''
+        hours, rest = divmod(abs(seconds), 3600)
+        raw = f"{sign}{hours:02d}:{rest // 60:02d}:{rest % 60:02d}".encode()
+    elif isinstance(value, decimal.Decimal):
+        raw = format(value, 'f').encode()
+    elif isinstance(value, float):
+        raw = repr(value).encode()
+    else:
+        raw = str(value).encode('utf-8')
+    return _TSV_SPECIAL.sub(lambda m: _TSV_REPLACEMENTS[m.group()], raw)
+
+
+def _estimate_sql_bytes(values: Tuple) -> int:
+    """Rough size of a row once interpolated into a VALUES (...) list; errs on the large side."""
+    size = 4
+    for value in values:
+        if value is None:
+            size += 6
+        elif isinstance(value, str):
+            size += len(value.encode('utf-8')) + 4
+        elif isinstance(value, (bytes, bytearray)):
+            size += 2 * len(value) + 12
+        else:
+            size += len(str(value)) + 4
+    return size
+
+
+def _joins_key(joins: Optional[Union[str, List[str]]]) -> Optional[Union[str, Tuple[str, ...]]]:
+    """joins in a hashable form for the memoized builders."""
+    return tuple(joins) if isinstance(joins, list) else joins
+
+
+_ORDER_TERM = re.compile(r'^\s*([\w.`]+)(?:\s+(ASC|DESC))?\s*$', re.IGNORECASE)
+
+
+def _parse_order_by(order_by: str) -> List[Tuple[str, bool]]:
+    """Parse "created_at DESC, id" into [("created_at", True), ("id", False)]."""
+    terms = []
+    for part in order_by.split(','):
+        match = _ORDER_TERM.match(part)
+        if not match:
+            raise ValueError(f"Unsupported ORDER BY term for keyset pagination: {part.strip()!r}")
+        terms.append((match.group(1), (match.group(2) or '').upper() == 'DESC'))
+    return terms
+
+
+def _encode_cursor_value(value):
+    if isinstance(value, datetime.datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {'d': value.isoformat()}
+    if isinstance(value, datetime.timedelta):
+        return {'td': value.total_seconds()}
+    if isinstance(value, decimal.Decimal):
+        return {'dec': str(value)}
+    if isinstance(value, (bytes, bytearray)):
+        return {'b': base64.b64encode(value).decode('ascii')}
+    return value
+
+
+def _decode_cursor_value(value):
+    if not isinstance(value, dict):
+        return value
+    if 'dt' in value:
+        return datetime.datetime.fromisoformat(value['dt'])
+    if 'd' in value:
+        return datetime.date.fromisoformat(value['d'])
+    if 'td' in value:
+        return datetime.timedelta(seconds=value['td'])
+    if 'dec' in value:
+        return decimal.Decimal(value['dec'])
+    return base64.b64decode(value['b'])
+
+
+def _encode_cursor(direction: str, values: List) -> str:
+    payload = {'dir': direction, 'key': [_encode_cursor_value(v) for v in values]}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode('ascii')
+
+
+def _decode_cursor(cursor: str) -> Tuple[str, List]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return payload['dir'], [_decode_cursor_value(v) for v in payload['key']]
+    except (ValueError, KeyError, TypeError) as err:
+        raise ValueError(f"Invalid pagination cursor: {err}") from None
+
+
+def _raw_connection(connection):
+    """The connector connection behind a pool's PooledMySQLConnection wrapper, which is new per checkout."""
+    return getattr(connection, '_cnx', None) or connection
+
+
+class PreparedStatementCache:
+    """
+    Server-side prepared statements for one underlying connection: one prepared
+    cursor per SQL template, the least recently used closed first. A pooled
+    connection keeps its cache across checkouts (its pool doesn't reset the
+    session); a direct connection's cache is closed along with it.
+    """
+
+    def __init__(self, connection, max_size: int, counters: Dict, lock: threading.Lock):
+        self.connection = connection
+        # Prepared statements die with the session; a reconnect gives a new id
+        self.connection_id = connection.connection_id
+        self.max_size = max_size
+        self._cursors: OrderedDict = OrderedDict()
+        self._counters = counters
+        self._lock = lock
+
+    def execute(self, query: str, params: Tuple, dictionary: bool = False):
+        """Execute query as a prepared statement and return the cursor holding its result."""
+        key = (query, dictionary)
+        entry = self._cursors.get(key)
+        if entry is not None:
+            self._cursors.move_to_end(key)
+            self._count('hits')
+        else:
+            self._count('misses')
+            entry = self._cursors[key] = (self.connection.cursor(prepared=True, dictionary=dictionary), query)
+            while len(self._cursors) > self.max_size:
+                _, (evicted, _) = self._cursors.popitem(last=False)
+                evicted.close()
+                self._count('evictions')
+
+        cursor, cached_query = entry
+        # The cursor only skips re-preparing when handed the identical string object
+        cursor.execute(cached_query, params)
+        return cursor
+
+    def close(self) -> None:
+        for cursor, _ in self._cursors.values():
+            try:
+                cursor.close()
+            except Error as err:
+                logger.debug(f"Could not close prepared statement: {err}")
+        self._cursors.clear()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+
+_PLAIN_READ = re.compile(r'^\s*SELECT\b', re.IGNORECASE)
+_LOCKING_READ = re.compile(r'\bFOR\s+(UPDATE|SHARE)\b|\bLOCK\s+IN\s+SHARE\s+MODE\b', re.IGNORECASE)
+
+
+def _is_plain_read(query: str) -> bool:
+    """A SELECT that takes no row locks, so sharing its result between callers is safe."""
+    return bool(_PLAIN_READ.match(query)) and not _LOCKING_READ.search(query)
+
+
+class SingleFlight:
+    """
+    Collapses identical concurrent calls: while one caller (the leader) runs a
+    key, other callers with the same key wait for and share its result.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable) -> Tuple[object, bool]:
+        """Returns (result, shared), where shared is True if another caller's execution was reused."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fn()
+        except BaseException as err:
+            future.set_exception(err)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class _Transaction:
+    """State of the transaction() block active in the current thread or asyncio task."""
+
+    def __init__(self, connection, database: Optional[str]):
+        self.connection = connection
+        self.database = database
+        # (table, database) pairs written inside the block; cache invalidation waits for the outcome
+        self.written_tables: List[Tuple[str, Optional[str]]] = []
+
+
+class DatabaseConnection:
+    ROW_FACTORIES = ('dict', 'record')
+
+    def __init__(self, use_pool: bool = True, pool_sizes: Optional[Dict[str, int]] = None,
+                 cache_size: int = 0, cache_ttl: float = 30.0, prepared_cache_size: int = 0,
+                 single_flight: bool = False, host: Optional[str] = None, port: Optional[int] = None,
+                 row_factory: str = 'dict', metrics: bool = False,
+                 slow_query_threshold: Optional[float] = None, slow_query_log: Optional[str] = None):
+        """
+        Args:
+            use_pool: reuse pooled connections, one pool per database name.
+            pool_sizes: per-database pool size overrides, e.g. {"demo_db": 10}.
+                        Databases not listed use DB_POOL_SIZE.
+            cache_size: enable the result cache for select/count/exists with this many
+                        entries. Writes made through this instance invalidate it per table.
+            cache_ttl: seconds a cached result stays valid.
+            prepared_cache_size: run the statements built by select/insert/update/delete/
+                        count/exists as server-side prepared statements, keeping up to
+                        this many per connection for as long as it lives. Pools then
+                        don't reset the session between checkouts, so session variables
+                        set through execute_query() carry over to the next user.
+            single_flight: identical plain SELECTs (same SQL and params) running
+                        concurrently outside a transaction share one execution.
+            host, port: connect to this server instead of DB_HOST (e.g. one shard),
+                        with the same credentials. DB_REPLICA_HOSTS is ignored then,
+                        since those replicas belong to DB_HOST.
+            row_factory: "dict" (default) or "record". With "record", rows that would be
+                        dicts are tuple-backed records.Record objects instead: read-only,
+                        with key and attribute access, and a fraction of the memory.
+            metrics: collect per-statement latency histograms, rows, bytes, errors and
+                        connection wait times in db.metrics (an instrumentation.QueryMetrics).
+            slow_query_threshold: log statements slower than this many seconds to
+                        db.slow_queries (a slowlog.SlowQueryLog), EXPLAINing slow SELECTs
+                        in the background. Defaults to DB_SLOW_QUERY_SECONDS.
+            slow_query_log: JSONL file for slow query entries. Defaults to DB_SLOW_QUERY_LOG.
+        """
+        if row_factory not in self.ROW_FACTORIES:
+            raise ValueError(f"row_factory must be one of {self.ROW_FACTORIES}, got {row_factory!r}")
+        self.row_factory = row_factory
+        self.config = DatabaseConfig()
+        if host:
+            self.config.host, self.config.port = host, port
+            self.config.replica_hosts = []
+        # Pools skip the session reset when statements are cached, so they survive checkouts
+        reset_session = prepared_cache_size <= 0
+        self.pools = ConnectionPoolRegistry(self.config, pool_sizes, reset_session=reset_session) if use_pool else None
+        self.cache = QueryCache(cache_size, cache_ttl) if cache_size > 0 else None
+        self._server_limits: Dict[Optional[str], Tuple[int, int]] = {}
+        self.prepared_cache_size = prepared_cache_size
+        self.single_flight = SingleFlight() if single_flight else None
+        self.replicas = ReplicaRouter([
+            Replica(host, port, weight,
+                    ConnectionPoolRegistry(self.config, pool_sizes, host, port, reset_session) if use_pool else None)
+            for host, port, weight in self.config.replica_hosts
+        ], self.config.replica_strategy, self.config.replica_max_lag) if self.config.replica_hosts else None
+        self._last_write: ContextVar[Optional[float]] = ContextVar(f"db_last_write_{id(self)}", default=None)
+        self._session_gtid: ContextVar[Optional[str]] = ContextVar(f"db_session_gtid_{id(self)}", default=None)
+        self.replica_monitor = None
+        if self.replicas and self.config.replica_max_lag is not None:
+            self.replica_monitor = ReplicaMonitor(self.config, self.replicas.replicas,
+                                                  self.config.replica_lag_check_interval)
+            self.replica_monitor.start()
+        self._statements: Dict[int, PreparedStatementCache] = {}
+        self._statement_counts = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._statement_lock = threading.Lock()
+        self._transaction: ContextVar[Optional[_Transaction]] = ContextVar(f"db_transaction_{id(self)}",
+                                                                           default=None)
+
+        if self.pools and self.config.database:
+            self.pools.get_pool(self.config.database)
+
+        self._count_cache: Dict[Tuple, Tuple[float, int]] = {}
+        self._count_cache_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+        self.hooks: List[QueryHook] = []
+        self._before_hooks: List[QueryHook] = []
+        self.metrics = QueryMetrics() if metrics else None
+        if self.metrics is not None:
+            self.add_hook(self.metrics)
+        if slow_query_threshold is None:
+            slow_query_threshold = self.config.slow_query_seconds
+        self.slow_queries = None
+        if slow_query_threshold is not None:
+            self.slow_queries = SlowQueryLog(slow_query_threshold, slow_query_log or self.config.slow_query_log,
+                                             explain=self._explain)
+            self.add_hook(self.slow_queries)
+        self._n_plus_one: Optional[NPlusOneDetector] = None
+        self._hooks_lock = threading.Lock()
+
+    def add_hook(self, hook: QueryHook) -> None:
+        """Call hook.before_execute/after_execute around every statement this instance sends."""
+        # Copy-on-write, so statements running on other threads iterate a stable list
+        self.hooks = self.hooks + [hook]
+        self._index_hooks()
+
+    def remove_hook(self, hook: QueryHook) -> None:
+        self.hooks = [h for h in self.hooks if h is not hook]
+        self._index_hooks()
+
+    @contextmanager
+    def detect_n_plus_one(self, threshold: Optional[int] = None,
+                          raise_on_detect: Optional[bool] = None) -> Iterator[DetectionScope]:
+        """
+        Count the statements run in this block (same thread or asyncio task) and report
+        templates executed with `threshold` or more distinct parameter sets, with the
+        call stack that issued them. Wrap a request handler or a test in it.
+
+        Args:
+            threshold: defaults to DB_N_PLUS_ONE_THRESHOLD (5).
+            raise_on_detect: raise nplusone.NPlusOneError on exit instead of logging a
+                             warning; defaults to DB_N_PLUS_ONE_RAISE, e.g. set in test runs.
+
+            with db.detect_n_plus_one() as scope:
+                for order in db.select('orders'):
+                    get_user_by_id(order['user_id'])   # reported: SELECT * FROM users WHERE id = ?
+        """
+        if self._n_plus_one is None:
+            with self._hooks_lock:
+                if self._n_plus_one is None:
+                    detector = NPlusOneDetector(self.config.n_plus_one_threshold, self.config.n_plus_one_raise)
+                    self.add_hook(detector)
+                    self._n_plus_one = detector
+        with self._n_plus_one.scope(threshold, raise_on_detect) as scope:
+            yield scope
+
+    def _index_hooks(self) -> None:
+        # Most hooks (QueryMetrics included) only look at finished statements
+        self._before_hooks = [h for h in self.hooks if type(h).before_execute is not QueryHook.before_execute]
+
+    def _before_execute(self, query: str, params, database: Optional[str]) -> QueryEvent:
+        event = QueryEvent(query, params, database)
+        for hook in self._before_hooks:
+            try:
+                hook.before_execute(event)
+            except Exception as err:
+                logger.warning(f"Query hook {hook!r} failed: {err}")
+        return event
+
+    def _after_execute(self, event: QueryEvent) -> None:
+        event.duration = time.perf_counter() - event.started - (event.wait or 0.0)
+        for hook in self.hooks:
+            try:
+                hook.after_execute(event)
+            except Exception as err:
+                logger.warning(f"Query hook {hook!r} failed: {err}")
+
+    def _explain(self, query: str, params, database: Optional[str] = None) -> Dict:
+        """EXPLAIN FORMAT=JSON on a connection of its own, bypassing hooks and any open transaction."""
+        connection = self._create_connection(database)
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(f"EXPLAIN FORMAT=JSON {query}", params or ())
+                return json.loads(cursor.fetchall()[0][0])
+            finally:
+                cursor.close()
+        finally:
+            connection.close()
+
+    def _current_transaction(self, database: Optional[str] = None) -> Optional[_Transaction]:
+        """The active transaction() block, if a call for `database` should join it."""
+        tx = self._transaction.get()
+        if tx is None:
+            return None
+        if database is None or database == (tx.database or self.config.database):
+            return tx
+        return None
+
+    def _dict_cursor(self, dictionary: bool) -> bool:
+        """Whether to ask the connector for dict rows; record rows are built from plain tuples."""
+        return dictionary and self.row_factory == 'dict'
+
+    def _wrap_rows(self, cursor, rows: List, dictionary: bool) -> List:
+        return make_records(cursor.description, rows) if dictionary and self.row_factory == 'record' else rows
+
+    def _execute(self, connection, cursor, query: str, params: Tuple,
+                 dictionary: bool = False, prepared: bool = False):
+        """_send() reported to the hooks, for statements run on an already checked-out connection."""
+        if not self.hooks:
+            return self._send(connection, cursor, query, params, dictionary, prepared)
+        event = self._before_execute(query, params, None)
+        try:
+            cursor = self._send(connection, cursor, query, params, dictionary, prepared)
+            event.rows = max(cursor.rowcount, 0)
+            return cursor
+        except BaseException as err:
+            event.error = err
+            raise
+        finally:
+            self._after_execute(event)
+
+    @contextmanager
+    def _observe(self, query: str, params, database: Optional[str]) -> Iterator[Optional[QueryEvent]]:
+        """
+        Report a statement whose rows are read incrementally to the hooks: the event
+        spans the execute and every fetch. Yields None when no hooks are registered.
+        """
+        if not self.hooks:
+            yield None
+            return
+        event = self._before_execute(query, params, database)
+        try:
+            yield event
+        except GeneratorExit:
+            # A stream closed early by its consumer is not a failed statement
+            raise
+        except BaseException as err:
+            event.error = err
+            raise
+        finally:
+            self._after_execute(event)
+
+    def _send(self, connection, cursor, query: str, params: Tuple,
+              dictionary: bool = False, prepared: bool = False):
+        """Run query on cursor, or as a cached prepared statement; returns the cursor holding the result."""
+        if prepared and self.prepared_cache_size:
+            raw = _raw_connection(connection)
+            statements = self._statements.get(id(raw))
+            if statements is None or statements.connection_id != raw.connection_id:
+                # New, or the pool reconnected it and the server dropped the old statements
+                statements = PreparedStatementCache(raw, self.prepared_cache_size,
+                                                    self._statement_counts, self._statement_lock)
+                with self._statement_lock:
+                    self._statements[id(raw)] = statements
+            return statements.execute(query, params, dictionary)
+        cursor.execute(query, params)
+        return cursor
+
+    def _release_statements(self, connection) -> None:
+        """Close the statement cache of a direct connection; pooled ones keep theirs for the next checkout."""
+        raw = _raw_connection(connection)
+        if raw is not connection or not self._statements:
+            return
+        with self._statement_lock:
+            statements = self._statements.pop(id(raw), None)
+        if statements is not None:
+            statements.close()
+
+    def prepared_stats(self) -> Dict:
+        with self._statement_lock:
+            stats = dict(self._statement_counts)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def _commit(self, connection) -> None:
+        """Commit, unless the connection belongs to a transaction() block that commits on exit."""
+        tx = self._transaction.get()
+        if tx is None or tx.connection is not connection:
+            connection.commit()
+            self._capture_gtid(connection)
+
+    def _capture_gtid(self, connection) -> None:
+        """With DB_TRACK_GTIDS, remember the primary's executed GTID set right after this context's write."""
+        if not (self.replicas and self.config.track_gtids):
+            return
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT @@GLOBAL.gtid_executed")
+            self._session_gtid.set(cursor.fetchall()[0][0])
+        finally:
+            cursor.close()
+
+    def _wait_for_gtid(self, connection, replica: Replica) -> bool:
+        """Make sure the replica has applied this context's last write; False if it didn't within the timeout."""
+        gtid = self._session_gtid.get()
+        if not gtid or replica.confirmed_gtid == gtid:
+            return True
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT WAIT_FOR_EXECUTED_GTID_SET(%s, %s)", (gtid, self.config.gtid_wait_timeout))
+            applied = cursor.fetchall()[0][0] == 0
+        finally:
+            cursor.close()
+        if applied:
+            replica.confirmed_gtid = gtid
+        return applied
+
+    def _cached_query(self, tables: Tuple[str, ...], query: str, params: Tuple,
+                      database: Optional[str] = None, dictionary: bool = False) -> List:
+        """execute_query() for reads, served from the result cache when it is enabled."""
+        # Inside a transaction the result may include our own uncommitted writes. A context
+        # that must read its own writes can't trust entries another context read from a replica
+        if self.cache is None or self._current_transaction(database) or self._reads_own_writes():
+            return self.execute_query(query, params, database, dictionary, prepared=True, read_only=True)
+
+        db = database or self.config.database
+        key = QueryCache.make_key(query, params, db, dictionary)
+        rows = self.cache.get(key)
+        if rows is None:
+            scoped = [f"{db}.{t}" if db and '.' not in t else t for t in tables]
+            snapshot = self.cache.snapshot(scoped)
+            rows = self.execute_query(query, params, database, dictionary, prepared=True, read_only=True)
+            self.cache.put(key, scoped, rows, snapshot)
+        # Callers may mutate what they get back; never hand out the cached objects
+        return [dict(row) if isinstance(row, dict) else row for row in rows]
+
+    def _invalidate(self, table: str, database: Optional[str] = None) -> None:
+        """Called after every write to table: drops cached results and starts read-your-writes stickiness."""
+        self._mark_write()
+        tx = self._current_transaction(database)
+        if tx is not None:
+            tx.written_tables.append((table, database))
+        elif self.cache is not None:
+            db = database or self.config.database
+            name = _table_names(table)[0]
+            self.cache.invalidate(f"{db}.{name}" if db and '.' not in name else name)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.config.pool_size,
+                                                        thread_name_prefix="db_worker")
+        return self._executor
+
+    def close(self) -> None:
+        """Shut down the background worker threads, if any were started."""
+        if self.replica_monitor is not None:
+            self.replica_monitor.stop()
+            self.replica_monitor = None
+        if self.slow_queries is not None:
+            self.slow_queries.close()
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+    def _create_connection(self, database=None) -> mysql.connector.MySQLConnection:
+        # Server-level connections (no database at all) are never pooled
+        db = database or self.config.database
+        if self.pools and db:
+            connection = self.pools.get_connection(db)
+            if connection is not None:
+                return connection
 
         try:
             connection = mysql.connector.connect(**self.config.get_connection_params(database))
@@ -73,13 +1023,82 @@ class DatabaseConnection:
             logger.error(f"Failed to connect: {err}")
             raise
 
+    def _use_replica(self) -> bool:
+        """Whether a read may go to a replica: replicas exist and this context hasn't written just now."""
+        if self.replicas is None:
+            return False
+        last_write = self._last_write.get()
+        return last_write is None or time.monotonic() - last_write >= self.config.read_sticky_seconds
+
+    def _reads_own_writes(self) -> bool:
+        """
+        Whether replica reads in this context are held back for read-your-writes: it is
+        within read_sticky_seconds of a write, or (with DB_TRACK_GTIDS) has a session GTID.
+        """
+        if self.replicas is None:
+            return False
+        return not self._use_replica() or (self.config.track_gtids and self._session_gtid.get() is not None)
+
+    def _mark_write(self) -> None:
+        if self.replicas is not None and self.config.read_sticky_seconds > 0:
+            self._last_write.set(time.monotonic())
+
+    def _create_read_connection(self, database=None) -> Tuple[mysql.connector.MySQLConnection, Optional[Replica]]:
+        """A replica connection and its replica, or a primary connection and None if no replica can serve."""
+        replica = self.replicas.choose() if self.replicas else None
+        if replica is None:
+            return self._create_connection(database), None
+
+        db = database or self.config.database
+        try:
+            connection = replica.pools.get_connection(db) if replica.pools and db else None
+            if connection is None:
+                connection = mysql.connector.connect(
+                    **self.config.get_connection_params(database, replica.host, replica.port))
+        except Error as err:
+            self.replicas.release(replica)
+            self.replicas.mark_down(replica)
+            logger.warning(f"Replica {replica.name} unavailable ({err}); reading from primary")
+            return self._create_connection(database), None
+        self.replicas.mark_up(replica)
+
+        try:
+            caught_up = self._wait_for_gtid(connection, replica)
+        except Error as err:
+            logger.warning(f"GTID wait on replica {replica.name} failed: {err}")
+            caught_up = False
+        if not caught_up:
+            connection.close()
+            self.replicas.release(replica)
+            logger.debug(f"Replica {replica.name} has not applied this session's writes; reading from primary")
+            return self._create_connection(database), None
+        return connection, replica
+
     @contextmanager
-    def get_cursor(self, database=None, dictionary=False):
+    def get_cursor(self, database=None, dictionary=False, buffered=None, read_only=False):
+        """
+        Args:
+            read_only: the statement only reads, so it may run on a replica.
+        """
+        tx = self._current_transaction(database)
+        if tx is not None:
+            # Errors propagate to transaction(), which rolls back
+            cursor = tx.connection.cursor(buffered=buffered, dictionary=dictionary)
+            try:
+                yield tx.connection, cursor
+            finally:
+                cursor.close()
+            return
+
         connection = None
         cursor = None
+        replica = None
         try:
-            connection = self._create_connection(database)
-            cursor = connection.cursor(dictionary=dictionary)
+            if read_only and self._use_replica():
+                connection, replica = self._create_read_connection(database)
+            else:
+                connection = self._create_connection(database)
+            cursor = connection.cursor(buffered=buffered, dictionary=dictionary)
             yield connection, cursor
         except Error as err:
             logger.error(f"Database operation failed: {err}")
@@ -89,54 +1108,197 @@ class DatabaseConnection:
         finally:
             if cursor:
                 cursor.close()
+            if connection:
+                self._release_statements(connection)
             if connection and connection.is_connected():
                 connection.close()
+            if replica is not None:
+                self.replicas.release(replica)
 
     def execute_query(self, query: str, params: Optional[Tuple] = None,
                       database: Optional[str] = None, dictionary: bool = False,
-                      fetch: bool = True, return_lastrowid: bool = False) -> Union[List, int]:
-        with self.get_cursor(database, dictionary) as (connection, cursor):
-            cursor.execute(query, params or ())
-            if fetch:
-                results = cursor.fetchall()
-                logger.debug(f"Query returned {len(results)} rows")
-                return results
-            else:
-                connection.commit()
-                if return_lastrowid:
-                    return cursor.lastrowid
-                affected = cursor.rowcount
-                logger.debug(f"Query affected {affected} rows")
-                return affected
+                      fetch: bool = True, return_lastrowid: bool = False,
+                      prepared: bool = False, read_only: bool = False) -> Union[List, int]:
+        """
+        Args:
+            prepared: run as a cached server-side prepared statement when the
+                      instance was created with prepared_cache_size.
+            read_only: the query only reads, so it may be routed to a replica
+                       (never inside transaction() or right after a write).
+        """
+        read_only = read_only and fetch and self._use_replica()
+        if (fetch and self.single_flight is not None and _is_plain_read(query)
+                and not self._current_transaction(database)):
+            # Stickiness already turns read_only off; a replica read also waits for the caller's
+            # session GTID, so only callers waiting for the same one may share it
+            session_gtid = self._session_gtid.get() if read_only else None
+            key = (database or self.config.database, query, params or (), dictionary, read_only, session_gtid)
+            try:
+                hash(key)
+            except TypeError:
+                key = None
+            if key is not None:
+                rows, shared = self.single_flight.do(key, lambda: self._run_query(
+                    query, params, database, dictionary, fetch, return_lastrowid, prepared, read_only))
+                if shared:
+                    # Every caller gets its own rows to mutate
+                    return [dict(row) if isinstance(row, dict) else row for row in rows]
+                return rows
+        return self._run_query(query, params, database, dictionary, fetch, return_lastrowid, prepared, read_only)
+
+    def _run_query(self, query: str, params: Optional[Tuple], database: Optional[str], dictionary: bool,
+                   fetch: bool, return_lastrowid: bool, prepared: bool, read_only: bool = False) -> Union[List, int]:
+        event = self._before_execute(query, params, database) if self.hooks else None
+        try:
+            with self.get_cursor(database, self._dict_cursor(dictionary), read_only=read_only) as (connection, cursor):
+                if event is not None:
+                    event.wait = time.perf_counter() - event.started
+                cursor = self._send(connection, cursor, query, params or (), self._dict_cursor(dictionary), prepared)
+                if fetch:
+                    results = self._wrap_rows(cursor, cursor.fetchall(), dictionary)
+                    logger.debug(f"Query returned {len(results)} rows")
+                    if event is not None:
+                        event.rows, event.result = len(results), results
+                    return results
+                else:
+                    self._commit(connection)
+                    self._mark_write()
+                    if event is not None:
+                        event.rows = cursor.rowcount
+                    if return_lastrowid:
+                        return cursor.lastrowid
+                    affected = cursor.rowcount
+                    logger.debug(f"Query affected {affected} rows")
+                    return affected
+        except BaseException as err:
+            if event is not None:
+                event.error = err
+            raise
+        finally:
+            if event is not None:
+                self._after_execute(event)
 
     def execute_many(self, query: str, param_list: List[Tuple], database: Optional[str] = None) -> int:
-        with self.get_cursor(database) as (connection, cursor):
-            cursor.executemany(query, param_list)
-            connection.commit()
-            affected = cursor.rowcount
-            logger.debug(f"Batch query affected {affected} rows")
-            return affected
+        event = self._before_execute(query, param_list, database) if self.hooks else None
+        try:
+            with self.get_cursor(database) as (connection, cursor):
+                if event is not None:
+                    event.wait = time.perf_counter() - event.started
+                cursor.executemany(query, param_list)
+                self._commit(connection)
+                self._mark_write()
+                affected = cursor.rowcount
+                logger.debug(f"Batch query affected {affected} rows")
+                if event is not None:
+                    event.rows = affected
+                return affected
+        except BaseException as err:
+            if event is not None:
+                event.error = err
+            raise
+        finally:
+            if event is not None:
+                self._after_execute(event)
 
     def insert(self, table: str, data: Union[Dict, List[Dict]],
                database: Optional[str] = None, on_duplicate: Optional[str] = None) -> int:
-        """Insert one or many records. Returns last insert ID for single inserts, rowcount for batch."""
+        """
+        Insert one or many records. Returns last insert ID for single inserts, rowcount for batch.
+        Batches go through insert_many(), which splits them to fit max_allowed_packet.
+        """
         if isinstance(data, dict):
             data = [data]
         if not data:
             return 0
 
-        columns = ', '.join(data[0].keys())
-        placeholders = ', '.join(['%s'] * len(data[0]))
-        query = f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"
+        if len(data) > 1:
+            return self.insert_many(table, data, database, on_duplicate)['rows']
+
+        query = self._build_insert(table, tuple(data[0].keys()), on_duplicate)
+        try:
+            return self.execute_query(query, tuple(data[0].values()), database, fetch=False, return_lastrowid=True,
+                                      prepared=True)
+        finally:
+            self._invalidate(table, database)
+
+    def insert_many(self, table: str, records: List[Dict], database: Optional[str] = None,
+                    on_duplicate: Optional[str] = None, commit_per_chunk: bool = False,
+                    max_rows_per_chunk: int = 5000) -> Dict:
+        """
+        Insert records as multi-row INSERT statements on one connection, chunked so
+        that no statement exceeds the server's max_allowed_packet (or max_rows_per_chunk rows).
+
+        Args:
+            commit_per_chunk: commit after every chunk instead of once for the whole batch.
+
+        Returns:
+            {"rows": 5000, "chunks": 2, "first_id": 101, "last_id": 5100}
+            first_id/last_id are the AUTO_INCREMENT ids generated for the first and last
+            record; they are None with on_duplicate, where rows may be updated instead.
+        """
+        result = {'rows': 0, 'chunks': 0, 'first_id': None, 'last_id': None}
+        if not records:
+            return result
 
+        columns = tuple(records[0].keys())
+        try:
+            with self.get_cursor(database) as (connection, cursor):
+                max_packet, id_step = self._insert_limits(cursor, database)
+                budget = int(max_packet * 0.9) - len(self._build_insert(table, columns, on_duplicate))
+
+                def flush(chunk: List[Tuple]) -> None:
+                    query = self._build_insert(table, columns, on_duplicate, rows=len(chunk))
+                    # Plain text: a prepared statement is capped at 65,535 placeholders, and
+                    # every distinct chunk length would take another slot in the LRU
+                    executed = self._execute(connection, cursor, query,
+                                             tuple(value for row in chunk for value in row))
+                    result['rows'] += executed.rowcount
+                    result['chunks'] += 1
+                    if not on_duplicate and executed.lastrowid:
+                        if result['first_id'] is None:
+                            result['first_id'] = executed.lastrowid
+                        # Ids of one multi-row INSERT are consecutive, auto_increment_increment apart
+                        result['last_id'] = executed.lastrowid + (len(chunk) - 1) * id_step
+                    if commit_per_chunk:
+                        self._commit(connection)
+
+                chunk, chunk_bytes = [], 0
+                for record in records:
+                    values = tuple(record.values())
+                    size = _estimate_sql_bytes(values)
+                    if chunk and (len(chunk) >= max_rows_per_chunk or chunk_bytes + size > budget):
+                        flush(chunk)
+                        chunk, chunk_bytes = [], 0
+                    chunk.append(values)
+                    chunk_bytes += size
+                flush(chunk)
+                self._commit(connection)
+        finally:
+            self._invalidate(table, database)
+
+        logger.debug(f"Batch insert of {result['rows']} rows in {result['chunks']} chunk(s)")
+        return result
+
+    def _insert_limits(self, cursor, database: Optional[str] = None) -> Tuple[int, int]:
+        """(max_allowed_packet, auto_increment_increment), read from the server once per database."""
+        db = database or self.config.database
+        limits = self._server_limits.get(db)
+        if limits is None:
+            cursor.execute("SELECT @@max_allowed_packet, @@auto_increment_increment")
+            row = cursor.fetchall()[0]
+            limits = self._server_limits[db] = (int(row[0]), int(row[1]))
+        return limits
+
+    @staticmethod
+    @lru_cache(maxsize=_STATEMENT_CACHE_SIZE)
+    def _build_insert(table: str, columns: Tuple[str, ...], on_duplicate: Optional[str] = None,
+                      rows: int = 1) -> str:
+        placeholders = '(' + ', '.join(['%s'] * len(columns)) + ')'
+        values = ', '.join([placeholders] * rows)
+        query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES {values}"
         if on_duplicate:
             query += f" ON DUPLICATE KEY UPDATE {on_duplicate}"
-
-        if len(data) == 1:
-            return self.execute_query(query, tuple(data[0].values()), database, fetch=False, return_lastrowid=True)
-        else:
-            param_list = [tuple(record.values()) for record in data]
-            return self.execute_many(query, param_list, database)
+        return query
 
     def select(self, table: str, columns: str = "*", where: Optional[str] = None,
                params: Optional[List] = None, order_by: Optional[str] = None,
@@ -151,61 +1313,457 @@ class DatabaseConnection:
                    e.g. "JOIN orders ON users.id = orders.user_id"
                    e.g. ["JOIN orders ON ...", "LEFT JOIN products ON ..."]
         """
+        query, query_params = self._select_statement(table, columns, where, params, order_by, limit, offset, joins)
+        return self._cached_query(_table_names(table, _joins_key(joins)), query, query_params, database, dictionary)
+
+    def iter_select(self, table: str, columns: str = "*", where: Optional[str] = None,
+                    params: Optional[List] = None, order_by: Optional[str] = None,
+                    limit: Optional[int] = None, offset: Optional[int] = None,
+                    database: Optional[str] = None, dictionary: bool = True,
+                    joins: Optional[Union[str, List[str]]] = None,
+                    batch_size: int = 1000) -> Iterator:
+        """Same arguments as select(), but yields rows lazily via stream_query()."""
+        query, query_params = self._select_statement(table, columns, where, params, order_by, limit, offset, joins)
+        return self.stream_query(query, query_params, database, dictionary, batch_size)
+
+    def stream_query(self, query: str, params: Optional[Tuple] = None,
+                     database: Optional[str] = None, dictionary: bool = False,
+                     batch_size: int = 1000) -> Iterator:
+        """
+        Yield rows from an unbuffered cursor, fetching batch_size rows at a time.
+
+        Memory stays bounded by batch_size regardless of the result size. The
+        connection is held only while the generator is alive: it is released when
+        the rows are exhausted, or when the generator is closed or garbage-collected.
+        """
+        with self._observe(query, params, database) as event, \
+                self.get_cursor(database, self._dict_cursor(dictionary), buffered=False) as (connection, cursor):
+            if event is not None:
+                event.wait = time.perf_counter() - event.started
+            cursor.execute(query, params or ())
+            try:
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    if event is not None:
+                        event.rows += len(rows)
+                    yield from self._wrap_rows(cursor, rows, dictionary)
+            finally:
+                self._abandon_result(connection)
+
+    def _abandon_result(self, connection) -> None:
+        """
+        Make a connection reusable after its unbuffered result was left part-way.
+
+        Draining would read every remaining row, so the statement is first stopped
+        with KILL QUERY from a short-lived connection to the same server; only the
+        rows already in flight are then read. If the kill fails, the rest is drained.
+        """
+        if not connection.unread_result:
+            return
+        try:
+            killer = mysql.connector.connect(**self.config.get_connection_params(
+                None, connection.server_host, connection.server_port))
+            try:
+                killer.cmd_query(f"KILL QUERY {connection.connection_id}")
+            finally:
+                killer.close()
+        except Error as err:
+            logger.warning(f"Could not stop abandoned query on connection {connection.connection_id}: {err}")
+        try:
+            connection.consume_results()
+        except Error as err:
+            # A killed statement ends its result with ER_QUERY_INTERRUPTED
+            logger.debug(f"Abandoned result ended with: {err}")
+
+    def select_columnar(self, table: str, columns: str = "*", where: Optional[str] = None,
+                        params: Optional[List] = None, order_by: Optional[str] = None,
+                        limit: Optional[int] = None, offset: Optional[int] = None,
+                        database: Optional[str] = None,
+                        joins: Optional[Union[str, List[str]]] = None,
+                        batch_size: int = 10000):
+        """
+        Same arguments as select(), but returns a columnar.ColumnarResult: one NumPy
+        array per column (int64/float64/datetime64, object for strings) plus null masks,
+        filled from fetchmany() batches without building a dict per row. Needs NumPy.
+
+            result = db.select_columnar('orders', 'user_id, total', where='status = %s', params=['paid'])
+            result['total'].sum()
+        """
+        from columnar import _require_numpy, build_columnar
+
+        _require_numpy()
+        query, query_params = self._select_statement(table, columns, where, params, order_by, limit, offset, joins)
+        with self._observe(query, query_params, database) as event, \
+                self.get_cursor(database, buffered=False, read_only=True) as (connection, cursor):
+            if event is not None:
+                event.wait = time.perf_counter() - event.started
+            cursor.execute(query, query_params)
+            try:
+                result = build_columnar(cursor.description, iter(lambda: cursor.fetchmany(batch_size), []))
+            finally:
+                self._abandon_result(connection)
+            if event is not None:
+                event.rows = len(result)
+        logger.debug(f"Columnar select returned {len(result)} rows")
+        return result
+
+    def export_query(self, query: str, params: Optional[Tuple], path: str, format: str = 'parquet',
+                     database: Optional[str] = None, batch_size: int = 50000) -> Dict:
+        """
+        Stream a query's rows into a Parquet, Arrow IPC or CSV file with bounded memory.
+
+        Rows are fetched from an unbuffered cursor batch_size at a time and each batch
+        is written (as an Arrow record batch for parquet/arrow) before the next is read.
+        The file appears at path only once the export completes.
+
+        Args:
+            format: "parquet", "arrow" (Arrow IPC file) or "csv". parquet and arrow need pyarrow.
+
+        Returns:
+            {"rows": 1200000, "path": "orders.parquet", "bytes": 48213321}
+        """
+        from export import EXPORT_FORMATS, _require_pyarrow, write_export
+
+        if format not in EXPORT_FORMATS:
+            raise ValueError(f"format must be one of {EXPORT_FORMATS}, got {format!r}")
+        if format != 'csv':
+            _require_pyarrow(format)
+        with self._observe(query, params, database) as event, \
+                self.get_cursor(database, buffered=False, read_only=True) as (connection, cursor):
+            if event is not None:
+                event.wait = time.perf_counter() - event.started
+            cursor.execute(query, params or ())
+            try:
+                result = write_export(path, format, cursor.description,
+                                      iter(lambda: cursor.fetchmany(batch_size), []))
+            finally:
+                self._abandon_result(connection)
+            if event is not None:
+                event.rows = result['rows']
+        logger.info(f"Exported {result['rows']} rows to {path} ({format}, {result['bytes']} bytes)")
+        return result
+
+    def parallel_scan(self, table: str, key: str = 'id', workers: int = 4, columns: str = "*",
+                      where: Optional[str] = None, params: Optional[List] = None,
+                      database: Optional[str] = None, dictionary: bool = True,
+                      batch_size: int = 1000, splits: Optional[int] = None,
+                      processor: Optional[Callable[[List], object]] = None,
+                      processes: Optional[int] = None) -> Iterator:
+        """
+        Scan a table on several connections at once, yielding lists of rows as they arrive.
+
+        The MIN/MAX of the integer key column is split into `splits` ranges (default
+        workers * 4), and `workers` threads each stream one range at a time on their
+        own connection (a replica, when configured). Batches come back in no particular
+        order; at most about 2 * workers batches are held in memory. The workers don't
+        see rows written by an open transaction().
+
+        Args:
+            processor: picklable function applied to every batch in a process pool of
+                       `processes` workers (default: one per CPU); its return values are
+                       yielded instead of the batches, in completion order.
+        """
+        batches = self._scan_batches(table, key, workers, columns, where, params, database,
+                                     dictionary, batch_size, splits)
+        if processor is None:
+            yield from batches
+            return
+
+        processes = processes or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            in_flight = set()
+            try:
+                for batch in batches:
+                    # Bounded like the scan itself, so a slow processor applies backpressure
+                    if len(in_flight) >= 2 * processes:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            yield future.result()
+                    in_flight.add(pool.submit(processor, batch))
+                while in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            finally:
+                batches.close()
+                for future in in_flight:
+                    future.cancel()
+
+    def _scan_batches(self, table: str, key: str, workers: int, columns: str, where: Optional[str],
+                      params: Optional[List], database: Optional[str], dictionary: bool,
+                      batch_size: int, splits: Optional[int]) -> Iterator[List]:
+        bounds_query = f"SELECT MIN({key}), MAX({key}) FROM {table}" + (f" WHERE {where}" if where else "")
+        low, high = self.execute_query(bounds_query, tuple(params or ()), database, read_only=True)[0]
+        if low is None:
+            return
+        if not isinstance(low, int) or not isinstance(high, int):
+            raise ValueError(f"parallel_scan needs an integer key column, got {type(low).__name__} for {key}")
+
+        splits = max(1, min(splits or workers * 4, high - low + 1))
+        edges = [low + (high - low + 1) * i // splits for i in range(splits + 1)]
+        range_where = (f"({where}) AND " if where else "") + f"{key} >= %s AND {key} < %s"
+        query = self._build_select(table, columns, range_where)
+
+        batches: queue.Queue = queue.Queue(maxsize=2 * workers)
+        stop = threading.Event()
+        done = object()
+
+        def put(item) -> bool:
+            # Gives up once the consumer has gone away, so no worker blocks forever
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def scan_range(start: int, end: int) -> None:
+            try:
+                if stop.is_set():
+                    return
+                range_params = tuple(params or ()) + (start, end)
+                with self._observe(query, range_params, database) as event, \
+                        self.get_cursor(database, self._dict_cursor(dictionary), buffered=False,
+                                        read_only=True) as (connection, cursor):
+                    if event is not None:
+                        event.wait = time.perf_counter() - event.started
+                    cursor.execute(query, range_params)
+                    try:
+                        while not stop.is_set():
+                            rows = cursor.fetchmany(batch_size)
+                            if event is not None:
+                                event.rows += len(rows)
+                            if not rows or not put(self._wrap_rows(cursor, rows, dictionary)):
+                                break
+                    finally:
+                        self._abandon_result(connection)
+            except Exception as err:
+                put(err)
+            finally:
+                put(done)
+
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db_scan")
+        try:
+            for start, end in zip(edges, edges[1:]):
+                executor.submit(scan_range, start, end)
+            finished = 0
+            while finished < splits:
+                item = batches.get()
+                if item is done:
+                    finished += 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+            logger.debug(f"Parallel scan of {table} finished: {splits} ranges on {workers} workers")
+        finally:
+            stop.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    @classmethod
+    def _select_statement(cls, table: str, columns: str = "*", where: Optional[str] = None,
+                          params: Optional[List] = None, order_by: Optional[str] = None,
+                          limit: Optional[int] = None, offset: Optional[int] = None,
+                          joins: Optional[Union[str, List[str]]] = None) -> Tuple[str, Tuple]:
+        """SELECT text and parameters; LIMIT/OFFSET are bound as parameters so pages share one template."""
+        query = cls._build_select(table, columns, where, order_by, limit is not None, offset is not None,
+                                  _joins_key(joins))
+        query_params = tuple(params or ())
+        if limit is not None:
+            query_params += (limit,)
+        if offset is not None:
+            query_params += (offset,)
+        return query, query_params
+
+    @staticmethod
+    @lru_cache(maxsize=_STATEMENT_CACHE_SIZE)
+    def _build_select(table: str, columns: str = "*", where: Optional[str] = None,
+                      order_by: Optional[str] = None, has_limit: bool = False,
+                      has_offset: bool = False,
+                      joins: Optional[Union[str, Tuple[str, ...]]] = None) -> str:
         query = f"SELECT {columns} FROM {table}"
 
         if joins:
-            join_clauses = joins if isinstance(joins, list) else [joins]
+            join_clauses = joins if isinstance(joins, tuple) else [joins]
             query += " " + " ".join(join_clauses)
 
-        query_params = list(params or [])
-
         if where:
             query += f" WHERE {where}"
         if order_by:
             query += f" ORDER BY {order_by}"
-        if limit is not None:
-            query += f" LIMIT {limit}"
-        if offset is not None:
-            query += f" OFFSET {offset}"
-
-        return self.execute_query(query, tuple(query_params), database, dictionary)
+        if has_limit:
+            query += " LIMIT %s"
+        if has_offset:
+            query += " OFFSET %s"
+        return query
 
     def update(self, table: str, data: Dict, where: str,
                params: Optional[List] = None, database: Optional[str] = None) -> int:
-        set_clause = ', '.join([f"{k} = %s" for k in data.keys()])
-        query = f"UPDATE {table} SET {set_clause} WHERE {where}"
+        query = self._build_update(table, tuple(data.keys()), where)
         query_params = list(data.values()) + (params or [])
-        return self.execute_query(query, tuple(query_params), database, fetch=False)
+        try:
+            return self.execute_query(query, tuple(query_params), database, fetch=False, prepared=True)
+        finally:
+            self._invalidate(table, database)
 
     def delete(self, table: str, where: str, params: Optional[List] = None,
                database: Optional[str] = None, soft: bool = False) -> int:
+        query = self._build_delete(table, where, soft)
+        try:
+            return self.execute_query(query, tuple(params or []), database, fetch=False, prepared=True)
+        finally:
+            self._invalidate(table, database)
+
+    @staticmethod
+    @lru_cache(maxsize=_STATEMENT_CACHE_SIZE)
+    def _build_update(table: str, columns: Tuple[str, ...], where: str) -> str:
+        set_clause = ', '.join([f"{k} = %s" for k in columns])
+        return f"UPDATE {table} SET {set_clause} WHERE {where}"
+
+    @staticmethod
+    @lru_cache(maxsize=_STATEMENT_CACHE_SIZE)
+    def _build_delete(table: str, where: str, soft: bool = False) -> str:
         if soft:
             # Use NOW() as a SQL expression, not a string value
-            query = f"UPDATE {table} SET deleted_at = NOW() WHERE {where}"
-            return self.execute_query(query, tuple(params or []), database, fetch=False)
-        else:
-            query = f"DELETE FROM {table} WHERE {where}"
-            return self.execute_query(query, tuple(params or []), database, fetch=False)
+            return f"UPDATE {table} SET deleted_at = NOW() WHERE {where}"
+        return f"DELETE FROM {table} WHERE {where}"
 
     def exists(self, table: str, where: str, params: Optional[List] = None,
                database: Optional[str] = None) -> bool:
-        query = f"SELECT 1 FROM {table} WHERE {where} LIMIT 1"
-        result = self.execute_query(query, tuple(params or []), database)
+        query = self._build_exists(table, where)
+        result = self._cached_query(_table_names(table), query, tuple(params or []), database)
         return len(result) > 0
 
     def count(self, table: str, where: Optional[str] = None,
               params: Optional[List] = None, database: Optional[str] = None) -> int:
+        query = self._build_count(table, where)
+        result = self._cached_query(_table_names(table), query, tuple(params or []), database)
+        return result[0][0]
+
+    @staticmethod
+    @lru_cache(maxsize=_STATEMENT_CACHE_SIZE)
+    def _build_exists(table: str, where: str) -> str:
+        return f"SELECT 1 FROM {table} WHERE {where} LIMIT 1"
+
+    @staticmethod
+    @lru_cache(maxsize=_STATEMENT_CACHE_SIZE)
+    def _build_count(table: str, where: Optional[str] = None) -> str:
         query = f"SELECT COUNT(*) FROM {table}"
         if where:
             query += f" WHERE {where}"
-        result = self.execute_query(query, tuple(params or []), database)
-        return result[0][0]
+        return query
 
     def upsert(self, table: str, data: Dict, update_fields: Optional[List[str]] = None,
                database: Optional[str] = None) -> int:
-        fields = update_fields if update_fields else list(data.keys())
-        updates = ', '.join([f"{field} = VALUES({field})" for field in fields])
-        return self.insert(table, data, database, on_duplicate=updates)
+        fields = tuple(update_fields) if update_fields else tuple(data.keys())
+        return self.insert(table, data, database, on_duplicate=self._upsert_clause(fields))
+
+    @staticmethod
+    @lru_cache(maxsize=_STATEMENT_CACHE_SIZE)
+    def _upsert_clause(fields: Tuple[str, ...]) -> str:
+        return ', '.join([f"{field} = VALUES({field})" for field in fields])
+
+    def bulk_load(self, table: str, rows: Iterable[Union[Sequence, Dict]], columns: Sequence[str],
+                  database: Optional[str] = None, chunk_size: int = 500_000,
+                  fallback_chunk_size: int = 1000) -> int:
+        """
+        Load a large number of rows with LOAD DATA LOCAL INFILE.
+
+        Rows are streamed into a temporary TSV file chunk_size rows at a time, so
+        memory stays flat for any input size; each chunk is loaded and committed
+        on its own. If local_infile is disabled on the server, rows are inserted
+        as chunked multi-row INSERTs instead.
+
+        Args:
+            rows: iterable of sequences ordered like `columns`, or of dicts keyed by them.
+            columns: target column names.
+
+        Returns:
+            Total number of rows loaded.
+        """
+        columns = list(columns)
+        # The connection may only send files from a private spool directory, so a
+        # server can't request arbitrary client files through LOAD DATA LOCAL
+        spool_dir = tempfile.mkdtemp(prefix='bulk_load_')
+        params = self.config.get_connection_params(database)
+        params['allow_local_infile'] = False
+        params['allow_local_infile_in_path'] = spool_dir
+        try:
+            connection = mysql.connector.connect(**params)
+        except Error:
+            shutil.rmtree(spool_dir, ignore_errors=True)
+            raise
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT @@local_infile")
+            use_infile = bool(cursor.fetchone()[0])
+            if not use_infile:
+                logger.info("local_infile is disabled on the server; bulk_load falls back to INSERTs")
+
+            total_loaded = 0
+            chunk = []
+            for row in rows:
+                chunk.append([row[col] for col in columns] if isinstance(row, dict) else row)
+                if len(chunk) >= chunk_size:
+                    loaded, use_infile = self._load_chunk(connection, cursor, table, columns, chunk,
+                                                          use_infile, fallback_chunk_size, spool_dir)
+                    total_loaded += loaded
+                    chunk = []
+            if chunk:
+                loaded, use_infile = self._load_chunk(connection, cursor, table, columns, chunk,
+                                                      use_infile, fallback_chunk_size, spool_dir)
+                total_loaded += loaded
+        except Error as err:
+            logger.error(f"Bulk load into {table} failed: {err}")
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+            connection.close()
+            shutil.rmtree(spool_dir, ignore_errors=True)
+            self._invalidate(table, database)
+
+        logger.debug(f"Bulk load inserted {total_loaded} rows into {table}")
+        return total_loaded
+
+    def _load_chunk(self, connection, cursor, table: str, columns: List[str], chunk: List,
+                    use_infile: bool, fallback_chunk_size: int, spool_dir: str) -> Tuple[int, bool]:
+        """Load one chunk and commit it. Returns (rows loaded, whether LOAD DATA is still usable)."""
+        if use_infile:
+            # Closed before loading and removed by hand: Windows can't reopen a file
+            # by name while a delete-on-close handle to it is open
+            with tempfile.NamedTemporaryFile(mode='wb', suffix='.tsv', dir=spool_dir, delete=False) as spool:
+                for row in chunk:
+                    spool.write(b'\t'.join(_tsv_field(value) for value in row) + b'\n')
+            path = spool.name.replace('\\', '/')
+            query = (f"LOAD DATA LOCAL INFILE '{path}' INTO TABLE {table} CHARACTER SET binary "
+                     f"({', '.join(columns)})")
+            try:
+                cursor = self._execute(connection, cursor, query, ())
+                connection.commit()
+                return cursor.rowcount, True
+            except Error as err:
+                if err.errno not in _LOCAL_INFILE_ERRORS:
+                    raise
+                logger.info(f"LOAD DATA LOCAL rejected ({err}); bulk_load falls back to INSERTs")
+            finally:
+                os.unlink(spool.name)
+
+        query = self._build_insert(table, tuple(columns))
+        loaded = 0
+        for start in range(0, len(chunk), fallback_chunk_size):
+            rows = [tuple(row) for row in chunk[start:start + fallback_chunk_size]]
+            with self._observe(query, rows, None) as event:
+                # executemany() rewrites a plain INSERT into a single multi-row statement
+                cursor.executemany(query, rows)
+                if event is not None:
+                    event.rows = cursor.rowcount
+            loaded += cursor.rowcount
+        connection.commit()
+        return loaded, False
 
     def create_database(self, database_name: str) -> None:
         query = f"CREATE DATABASE IF NOT EXISTS `{database_name}`"
@@ -247,6 +1805,7 @@ class DatabaseConnection:
             raise ValueError(f"Invalid table name: {table_name!r}")
         query = f"DROP TABLE IF EXISTS `{table_name}`"
         self.execute_query(query, database=database, fetch=False)
+        self._invalidate(table_name, database)
         logger.info(f"Table '{table_name}' dropped")
 
     def test_connection(self, database: Optional[str] = None) -> bool:
@@ -259,13 +1818,29 @@ class DatabaseConnection:
 
     @contextmanager
     def transaction(self, database: Optional[str] = None):
-        """Context manager for explicit transactions. Yields the connection object."""
+        """
+        Context manager for explicit transactions. Yields the connection object.
+
+        DatabaseConnection methods called inside the block from the same thread or
+        asyncio task run on this connection and are committed once, on exit.
+        Nested transaction() calls join the outer transaction.
+        """
+        outer = self._current_transaction(database)
+        if outer is not None:
+            yield outer.connection
+            return
+
         connection = None
+        tx = None
+        token = None
         try:
             connection = self._create_connection(database)
             connection.start_transaction()
+            tx = _Transaction(connection, database)
+            token = self._transaction.set(tx)
             yield connection
             connection.commit()
+            self._capture_gtid(connection)
             logger.debug("Transaction committed")
         except Exception as err:
             if connection:
@@ -273,60 +1848,310 @@ class DatabaseConnection:
                 logger.error(f"Transaction rolled back: {err}")
             raise
         finally:
+            if token is not None:
+                self._transaction.reset(token)
+            if connection:
+                self._release_statements(connection)
             if connection and connection.is_connected():
                 connection.close()
+            if tx is not None:
+                for table, table_database in tx.written_tables:
+                    self._invalidate(table, table_database)
 
     def batch_update(self, table: str, updates: List[Dict], key_field: str,
-                     database: Optional[str] = None) -> int:
+                     database: Optional[str] = None, chunk_size: int = 500) -> int:
         """
         Update multiple rows in a single transaction.
 
+        Records that update the same set of columns are grouped and sent as one
+        UPDATE ... SET col = CASE key WHEN ... END WHERE key IN (...) per chunk,
+        all on the transaction's connection.
+
         Args:
             updates: list of dicts, each containing key_field and fields to update.
                      Input dicts are NOT mutated.
+            chunk_size: maximum number of rows per generated UPDATE statement.
         """
         if not updates:
             return 0
+        if chunk_size < 1:
+            raise ValueError(f"chunk_size must be positive, got {chunk_size}")
 
+        groups = self._group_updates(updates, key_field)
         total_affected = 0
-        with self.transaction(database):
-            for record in updates:
-                key_value = record[key_field]
-                data = {k: v for k, v in record.items() if k != key_field}
-                if data:
-                    total_affected += self.update(table, data, f"{key_field} = %s", [key_value], database)
+        try:
+            with self.transaction(database) as connection:
+                cursor = connection.cursor()
+                try:
+                    for columns, rows in groups.items():
+                        keys = list(rows)
+                        for start in range(0, len(keys), chunk_size):
+                            chunk = keys[start:start + chunk_size]
+                            query, query_params = self._build_batch_update(table, key_field, columns, chunk, rows)
+                            # Plain text, like insert_many(): chunks can exceed the prepared placeholder limit
+                            executed = self._execute(connection, cursor, query, query_params)
+                            total_affected += executed.rowcount
+                finally:
+                    cursor.close()
+        finally:
+            self._invalidate(table, database)
 
+        logger.debug(f"Batch update affected {total_affected} rows")
         return total_affected
 
+    @staticmethod
+    def _group_updates(updates: List[Dict], key_field: str) -> Dict[Tuple[str, ...], Dict]:
+        """
+        Merge the records for each key in input order, so a later record overrides only
+        the columns it sets, as row-by-row updates would; then group the merged rows by
+        the columns they update.
+        """
+        merged: Dict = {}
+        for record in updates:
+            merged.setdefault(record[key_field], {}).update(record)
+
+        groups: Dict[Tuple[str, ...], Dict] = {}
+        for key, record in merged.items():
+            columns = tuple(sorted(k for k in record if k != key_field))
+            if columns:
+                groups.setdefault(columns, {})[key] = record
+        return groups
+
+    @staticmethod
+    def _build_batch_update(table: str, key_field: str, columns: Tuple[str, ...],
+                            keys: List, rows: Dict) -> Tuple[str, Tuple]:
+        when_clauses = ' '.join(['WHEN %s THEN %s'] * len(keys))
+        set_clause = ', '.join(f"{col} = CASE {key_field} {when_clauses} END" for col in columns)
+        placeholders = ', '.join(['%s'] * len(keys))
+        query = f"UPDATE {table} SET {set_clause} WHERE {key_field} IN ({placeholders})"
+
+        query_params = []
+        for col in columns:
+            for key in keys:
+                query_params.extend((key, rows[key][col]))
+        query_params.extend(keys)
+        return query, tuple(query_params)
+
+    def paginate_keyset(self, table: str, order_by: str, cursor: Optional[str] = None,
+                        per_page: int = 10, columns: str = "*", where: Optional[str] = None,
+                        params: Optional[List] = None, database: Optional[str] = None,
+                        joins: Optional[Union[str, List[str]]] = None) -> Dict:
+        """
+        Cursor-based (seek) pagination. Every page costs the same, however deep,
+        because rows are located by the last seen order_by key instead of OFFSET.
+
+        Args:
+            order_by: columns with optional ASC/DESC, e.g. "created_at DESC, id".
+                      Must be a unique ordering (end with a unique column), the
+                      columns must be NOT NULL, and every column must appear in
+                      the selected columns.
+            cursor: next_cursor or prev_cursor from a previous call; None for the first page.
+
+        Returns:
+            {
+                "data": [...],
+                "pagination": {
+                    "per_page": 10, "next_cursor": "...", "prev_cursor": None,
+                    "has_next": True, "has_prev": False
+                }
+            }
+        """
+        terms = _parse_order_by(order_by)
+        direction, key_values = _decode_cursor(cursor) if cursor else ('next', None)
+        backward = direction == 'prev'
+
+        conditions = [f"({where})"] if where else []
+        query_params = list(params or [])
+        if key_values is not None:
+            if len(key_values) != len(terms):
+                raise ValueError("Pagination cursor does not match order_by")
+            if None in key_values:
+                raise ValueError("Invalid pagination cursor: NULL key value")
+            seek_sql, seek_params = self._build_seek(terms, key_values, backward)
+            conditions.append(seek_sql)
+            query_params.extend(seek_params)
+
+        # Walking backwards: invert the ordering, then restore it on the fetched rows
+        scan_order = ', '.join(f"{col} {'ASC' if desc == backward else 'DESC'}" for col, desc in terms)
+        query, query_params = self._select_statement(table, columns, ' AND '.join(conditions) or None,
+                                                     query_params, scan_order, per_page + 1, None, joins)
+        records = self.execute_query(query, query_params, database, dictionary=True, read_only=True)
+
+        has_more = len(records) > per_page
+        records = records[:per_page]
+        if backward:
+            records.reverse()
+            has_next, has_prev = True, has_more
+        else:
+            has_next, has_prev = has_more, key_values is not None
+
+        def row_key(row: Dict) -> List:
+            try:
+                values = [row[col.split('.')[-1].strip('`')] for col, _ in terms]
+            except KeyError as err:
+                raise ValueError(f"order_by column {err} must be included in the selected columns") from None
+            # A seek predicate never matches NULL, so rows past a NULL key would be skipped
+            for (col, _), value in zip(terms, values):
+                if value is None:
+                    raise ValueError(f"order_by column {col} is NULL; keyset pagination needs NOT NULL columns")
+            return values
+
+        return {
+            'data': records,
+            'pagination': {
+                'per_page': per_page,
+                'next_cursor': _encode_cursor('next', row_key(records[-1])) if has_next and records else None,
+                'prev_cursor': _encode_cursor('prev', row_key(records[0])) if has_prev and records else None,
+                'has_next': has_next and bool(records),
+                'has_prev': has_prev and bool(records),
+            }
+        }
+
+    @staticmethod
+    def _build_seek(terms: List[Tuple[str, bool]], key_values: List, backward: bool) -> Tuple[str, List]:
+        """Rows strictly after (or before) key_values: (a > x) OR (a = x AND b < y) OR ..."""
+        branches = []
+        seek_params = []
+        for i, (col, desc) in enumerate(terms):
+            op = '<' if desc != backward else '>'
+            parts = [f"{prev_col} = %s" for prev_col, _ in terms[:i]] + [f"{col} {op} %s"]
+            branches.append('(' + ' AND '.join(parts) + ')')
+            seek_params.extend(key_values[:i + 1])
+        return '(' + ' OR '.join(branches) + ')', seek_params
+
+    PAGINATE_TOTALS = ('exact', 'none', 'estimate', 'cached')
+
     def paginate(self, table: str, page: int = 1, per_page: int = 10,
                  columns: str = "*", where: Optional[str] = None,
                  params: Optional[List] = None, order_by: Optional[str] = None,
                  database: Optional[str] = None,
-                 joins: Optional[Union[str, List[str]]] = None) -> Dict:
+                 joins: Optional[Union[str, List[str]]] = None,
+                 total: str = 'exact', total_ttl: float = 60.0,
+                 parallel: bool = False) -> Dict:
         """
         Returns a page of results along with pagination metadata.
 
+        Args:
+            total: how the total row count is produced:
+                   "exact"    - run COUNT(*) (default).
+                   "none"     - skip the count; has_next comes from fetching one extra row.
+                   "estimate" - optimizer estimate from information_schema / EXPLAIN.
+                   "cached"   - exact COUNT(*) reused for total_ttl seconds per (table, where, params).
+                   pagination["total_source"] says which source produced the total
+                   ("exact", "none", "estimate" or "cache").
+            parallel: with total="exact", run the COUNT(*) on a worker thread while the
+                      page is fetched, so latency is max(count, select) rather than the sum.
+
         Returns:
             {
                 "data": [...],
                 "pagination": {
                     "page": 1, "per_page": 10, "total": 100,
-                    "pages": 10, "has_next": True, "has_prev": False
+                    "pages": 10, "has_next": True, "has_prev": False,
+                    "total_source": "exact"
                 }
             }
         """
+        if total not in self.PAGINATE_TOTALS:
+            raise ValueError(f"total must be one of {self.PAGINATE_TOTALS}, got {total!r}")
+
         offset = (page - 1) * per_page
-        total = self.count(table, where, params, database)
-        records = self.select(table, columns, where, params, order_by, per_page, offset, database, joins=joins)
+        if total == 'exact':
+            # Worker threads can't see the transaction's connection, so stay sequential in one
+            if parallel and not self._current_transaction(database):
+                # Carry the caller's context so read-your-writes stickiness applies on the worker too
+                count_future = self._get_executor().submit(copy_context().run, self.count,
+                                                           table, where, params, database)
+                records = self.select(table, columns, where, params, order_by, per_page, offset, database, joins=joins)
+                row_count = count_future.result()
+            else:
+                row_count = self.count(table, where, params, database)
+                records = self.select(table, columns, where, params, order_by, per_page, offset, database, joins=joins)
+            has_next = page * per_page < row_count
+            total_source = 'exact'
+        else:
+            # The page itself decides has_next, so an approximate total can't make it lie
+            records = self.select(table, columns, where, params, order_by, per_page + 1, offset, database, joins=joins)
+            has_next = len(records) > per_page
+            records = records[:per_page]
+            if total == 'none':
+                row_count, total_source = None, 'none'
+            elif total == 'estimate':
+                row_count, total_source = self._estimate_count(table, where, params, database, joins), 'estimate'
+            else:
+                row_count, total_source = self._cached_count(table, where, params, database, total_ttl)
 
         return {
             'data': records,
             'pagination': {
                 'page': page,
                 'per_page': per_page,
-                'total': total,
-                'pages': (total + per_page - 1) // per_page if total else 0,
-                'has_next': page * per_page < total,
+                'total': row_count,
+                'pages': None if row_count is None else (row_count + per_page - 1) // per_page,
+                'has_next': has_next,
                 'has_prev': page > 1,
+                'total_source': total_source,
             }
         }
+
+    def _estimate_count(self, table: str, where: Optional[str] = None,
+                        params: Optional[List] = None, database: Optional[str] = None,
+                        joins: Optional[Union[str, List[str]]] = None) -> int:
+        """Row estimate without scanning: table statistics when unfiltered, EXPLAIN otherwise."""
+        if not where and not joins:
+            query, query_params = self._table_rows_statement(table, database or self.config.database)
+            result = self.execute_query(query, query_params, database, read_only=True)
+            if result and result[0][0] is not None:
+                return int(result[0][0])
+
+        plan = self.execute_query(self._explain_count_statement(table, where, _joins_key(joins)),
+                                  tuple(params or []), database, dictionary=True, read_only=True)
+        return self._estimate_from_plan(plan)
+
+    @staticmethod
+    def _table_rows_statement(table: str, database: Optional[str]) -> Tuple[str, Tuple]:
+        """information_schema lookup of a table's TABLE_ROWS statistic; shared with the async client."""
+        name = table.split()[0].replace('`', '')
+        schema, _, name = name.rpartition('.')
+        query = """
+            SELECT TABLE_ROWS FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s
+        """
+        return query, (schema or database, name)
+
+    @classmethod
+    def _explain_count_statement(cls, table: str, where: Optional[str],
+                                 joins: Optional[Union[str, Tuple[str, ...]]]) -> str:
+        return "EXPLAIN " + cls._build_select(table, "1", where, joins=joins)
+
+    @staticmethod
+    def _estimate_from_plan(plan: List[Dict]) -> int:
+        """
+        Estimated result rows of an EXPLAIN: `rows` is what a step examines, so it is scaled
+        by `filtered` (the percentage left after the WHERE), and the steps of a join multiply,
+        as the optimizer's own prefix-row estimate does. Subquery steps are left out.
+        """
+        if not plan:
+            return 0
+        estimate = 1.0
+        for step in plan:
+            if step.get('id', 1) != 1:
+                continue
+            filtered = step.get('filtered')
+            estimate *= float(step.get('rows') or 0) * (100.0 if filtered is None else float(filtered)) / 100
+        return int(round(estimate))
+
+    def _cached_count(self, table: str, where: Optional[str], params: Optional[List],
+                      database: Optional[str], ttl: float) -> Tuple[int, str]:
+        key = (database or self.config.database, table, where, tuple(params or []))
+        now = time.monotonic()
+        with self._count_cache_lock:
+            entry = self._count_cache.get(key)
+        if entry and entry[0] > now:
+            return entry[1], 'cache'
+
+        row_count = self.count(table, where, params, database)
+        with self._count_cache_lock:
+            self._count_cache = {k: v for k, v in self._count_cache.items() if v[0] > now}
+            self._count_cache[key] = (now + ttl, row_count)
+        return row_count, 'exact'
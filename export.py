@@ -0,0 +1,159 @@
+"""
+Streaming export of query results to Parquet, Arrow IPC or CSV files.
+
+Rows are read from an unbuffered cursor in fetchmany() batches and each batch
+is written out before the next one is fetched, so memory stays bounded by the
+batch size however large the result. The Arrow schema comes from the cursor
+description, so every batch shares it. DECIMAL columns become decimal256
+values at the scale read from the first batch, or decimal text when the first
+batch holds no value for them.
+
+Parquet and Arrow need pyarrow (an optional dependency); CSV uses the csv module.
+"""
+import csv
+import decimal
+import os
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from mysql.connector.constants import FieldFlag, FieldType
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+EXPORT_FORMATS = ('parquet', 'arrow', 'csv')
+
+_INTEGER_TYPES = {FieldType.TINY, FieldType.SHORT, FieldType.INT24, FieldType.LONG,
+                  FieldType.LONGLONG, FieldType.YEAR, FieldType.BIT}
+_DECIMAL_TYPES = {FieldType.DECIMAL, FieldType.NEWDECIMAL}
+_BINARY_CHARSET = 63
+# MySQL DECIMAL allows 65 digits; decimal256's 76 hold any of them at the column's scale
+_DECIMAL_PRECISION = 76
+
+
+def _require_pyarrow(format: str) -> None:
+    if pa is None:
+        raise ImportError(f"Exporting to {format} needs pyarrow: pip install pyarrow")
+
+
+def _decimal_scale(values: Sequence) -> Optional[int]:
+    """The column's scale, or None if the sample has no non-NULL value to read it from."""
+    # MySQL sends DECIMAL values padded to the column's scale, so any one value tells it
+    for value in values:
+        if isinstance(value, decimal.Decimal):
+            return max(0, -value.as_tuple().exponent)
+    return None
+
+
+def _arrow_field(column: Sequence, sample: Sequence):
+    """Arrow field for one cursor.description entry; sample is the column's first batch."""
+    name, type_code = column[0], column[1]
+    nullable = bool(column[6]) if len(column) > 6 else True
+    flags = column[7] if len(column) > 7 else 0
+    charset = column[8] if len(column) > 8 else None
+
+    if type_code in _INTEGER_TYPES:
+        unsigned_bigint = type_code == FieldType.LONGLONG and flags & FieldFlag.UNSIGNED
+        arrow_type = pa.uint64() if unsigned_bigint else pa.int64()
+    elif type_code in (FieldType.FLOAT, FieldType.DOUBLE):
+        arrow_type = pa.float64()
+    elif type_code in _DECIMAL_TYPES:
+        # The cursor doesn't report precision or scale. Without a value to read the scale
+        # from, the column is written as exact decimal text rather than guessed
+        scale = _decimal_scale(sample)
+        arrow_type = pa.string() if scale is None else pa.decimal256(_DECIMAL_PRECISION, scale)
+    elif type_code in (FieldType.DATETIME, FieldType.TIMESTAMP):
+        arrow_type = pa.timestamp('us')
+    elif type_code in (FieldType.DATE, FieldType.NEWDATE):
+        arrow_type = pa.date32()
+    elif type_code == FieldType.TIME:
+        arrow_type = pa.duration('us')
+    elif type_code == FieldType.GEOMETRY or charset == _BINARY_CHARSET:
+        arrow_type = pa.binary()
+    else:
+        arrow_type = pa.string()
+    return pa.field(name, arrow_type, nullable=nullable)
+
+
+def _text(value):
+    """Strings as str: JSON and text columns may arrive as bytes, SET columns as Python sets."""
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value).decode('utf-8', errors='backslashreplace')
+    if isinstance(value, set):
+        return ','.join(sorted(value))
+    return str(value)
+
+
+def _record_batch(schema, rows: List[Tuple]):
+    arrays = []
+    for field, values in zip(schema, zip(*rows)):
+        if pa.types.is_string(field.type):
+            values = [_text(value) for value in values]
+        elif pa.types.is_binary(field.type):
+            values = [bytes(value) if isinstance(value, bytearray) else value for value in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _write_arrow(path: str, format: str, description: Sequence, batches: Iterator[List[Tuple]]) -> int:
+    first = next(batches, [])
+    columns = list(zip(*first)) or [()] * len(description)
+    schema = pa.schema([_arrow_field(column, sample) for column, sample in zip(description, columns)])
+    if format == 'parquet':
+        writer = pq.ParquetWriter(path, schema)
+        write: Callable = writer.write_batch
+    else:
+        writer = pa.ipc.new_file(path, schema)
+        write = writer.write_batch
+
+    rows = 0
+    try:
+        batch = first
+        while batch:
+            write(_record_batch(schema, batch))
+            rows += len(batch)
+            batch = next(batches, [])
+    finally:
+        writer.close()
+    return rows
+
+
+def _write_csv(path: str, description: Sequence, batches: Iterator[List[Tuple]]) -> int:
+    rows = 0
+    with open(path, 'w', newline='', encoding='utf-8') as handle:
+        writer = csv.writer(handle)
+        writer.writerow([column[0] for column in description])
+        for batch in batches:
+            writer.writerows([[_text(value) if isinstance(value, (bytes, bytearray, set)) else value
+                               for value in row] for row in batch])
+            rows += len(batch)
+    return rows
+
+
+def write_export(path: str, format: str, description: Sequence, batches: Iterator[List[Tuple]]) -> Dict:
+    """
+    Write tuple-row batches to path, via a temporary file renamed into place on
+    success, so readers never see a partial export.
+
+    Returns:
+        {"rows": 1200000, "path": "orders.parquet", "bytes": 48213321}
+    """
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of {EXPORT_FORMATS}, got {format!r}")
+    partial = f"{path}.partial"
+    try:
+        if format == 'csv':
+            rows = _write_csv(partial, description, batches)
+        else:
+            rows = _write_arrow(partial, format, description, batches)
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return {'rows': rows, 'path': path, 'bytes': os.path.getsize(path)}
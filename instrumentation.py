@@ -0,0 +1,312 @@
+"""
+Per-query instrumentation: execute hooks and a latency/row metrics collector.
+
+DatabaseConnection calls every registered QueryHook around each statement it
+sends. QueryMetrics is the built-in hook: it keeps an HDR-style latency
+histogram, row, byte and error counts per statement fingerprint, plus a
+histogram of connection checkout waits, and renders them as a snapshot dict
+or in the Prometheus text exposition format.
+"""
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"")
+_NUMBER_LITERAL = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|%\(\w+\)s')
+_VALUE_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_REPEATED_LISTS = re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+')
+_REPEATED_WHENS = re.compile(r'(?:WHEN \? THEN \? ?)+', re.IGNORECASE)
+_SPACES = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(query: str) -> str:
+    """
+    Normalized statement text: literals and placeholders become ?, and IN lists,
+    multi-row VALUES and CASE WHEN chains collapse, so every call shape of one
+    statement shares a fingerprint.
+    """
+    text = _STRING_LITERAL.sub('?', query)
+    text = _PLACEHOLDER.sub('?', text)
+    text = _NUMBER_LITERAL.sub('?', text)
+    text = _SPACES.sub(' ', text).strip()
+    text = _VALUE_LIST.sub('(...)', text)
+    text = _REPEATED_LISTS.sub('(...)', text)
+    return _REPEATED_WHENS.sub('WHEN ? THEN ? ', text)
+
+
+class QueryEvent:
+    """One statement as seen by hooks. Times are in seconds."""
+    __slots__ = ('query', 'params', 'database', 'started', 'wait', 'duration', 'rows', 'result', 'error')
+
+    def __init__(self, query: str, params, database: Optional[str]):
+        self.query = query
+        self.params = params
+        self.database = database
+        self.started = time.perf_counter()
+        self.wait: Optional[float] = None   # connection checkout; None if none was needed
+        self.duration = 0.0                 # execute + fetch, after checkout
+        self.rows = 0                       # rows fetched, or rows affected by a write
+        self.result = None                  # fetched rows, for reads
+        self.error: Optional[BaseException] = None
+
+
+class QueryHook:
+    """Base class for instrumentation hooks; override either method."""
+
+    def before_execute(self, event: QueryEvent) -> None:
+        pass
+
+    def after_execute(self, event: QueryEvent) -> None:
+        pass
+
+
+class LatencyHistogram:
+    """
+    Log-linear histogram over integer microseconds, like HdrHistogram with 3
+    significant bits: exact below 16µs, then 8 buckets per power of two, so any
+    recorded value is within 12.5% of its bucket's bounds.
+    """
+    SUB_BUCKET_BITS = 3
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    @classmethod
+    def _index(cls, micros: int) -> int:
+        shift = micros.bit_length() - cls.SUB_BUCKET_BITS - 1
+        if shift <= 0:
+            return micros
+        return (shift << cls.SUB_BUCKET_BITS) + (micros >> shift)
+
+    @classmethod
+    def _upper_bound(cls, index: int) -> int:
+        """Exclusive upper bound of a bucket, in microseconds."""
+        if index < 2 << cls.SUB_BUCKET_BITS:
+            return index + 1
+        shift = (index >> cls.SUB_BUCKET_BITS) - 1
+        return (index - (shift << cls.SUB_BUCKET_BITS) + 1) << shift
+
+    def record(self, seconds: float) -> None:
+        micros = int(seconds * 1_000_000)
+        # _index() inlined for SUB_BUCKET_BITS = 3: this runs for every statement
+        shift = micros.bit_length() - 4
+        index = micros if shift <= 0 else (shift << 3) + (micros >> shift)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other: 'LatencyHistogram') -> None:
+        for index, count in list(other.counts.items()):
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q: float) -> float:
+        """Upper bound (seconds) of the bucket holding the q-th percentile, 0 <= q <= 100."""
+        if not self.count:
+            return 0.0
+        rank = max(1, int(self.count * q / 100 + 0.5))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._upper_bound(index) / 1_000_000, self.max)
+        return self.max
+
+    def cumulative(self, bounds: Tuple[float, ...]) -> List[int]:
+        """Counts of values at or below each bound (seconds), bucket-accurate."""
+        totals = [0] * len(bounds)
+        for index, count in self.counts.items():
+            value = (self._upper_bound(index) - 1) / 1_000_000
+            for position, bound in enumerate(bounds):
+                if value <= bound:
+                    totals[position] += count
+        return totals
+
+    def summary(self) -> Dict:
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+        }
+
+
+class _StatementStats:
+    __slots__ = ('latency', 'rows', 'bytes', 'errors')
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.rows = 0
+        self.bytes = 0
+        self.errors = 0
+
+
+def _result_bytes(rows: List) -> int:
+    """Approximate payload size of fetched rows: text and binary lengths, 8 bytes for anything else."""
+    size = 0
+    for row in rows:
+        for value in (row.values() if isinstance(row, dict) else row):
+            if isinstance(value, (str, bytes, bytearray)):
+                size += len(value)
+            elif value is not None:
+                size += 8
+    return size
+
+
+def _label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class _Shard:
+    """One thread's share of QueryMetrics, so recording never takes a lock."""
+    __slots__ = ('statements', 'wait')
+
+    def __init__(self):
+        self.statements: Dict[str, _StatementStats] = {}
+        self.wait = LatencyHistogram()
+
+
+class QueryMetrics(QueryHook):
+    """
+    Built-in collector: DatabaseConnection(metrics=True) registers one as db.metrics.
+
+    Each thread records into its own shard; snapshot() and render_prometheus()
+    merge them, so a reading taken while queries run may lag by a statement.
+
+    Args:
+        max_statements: distinct fingerprints tracked per thread; later ones are counted under "other".
+        track_bytes: estimate the size of fetched rows. Costs time per row, so turn it
+                     off when per-query overhead on large results matters.
+    """
+    OTHER = 'other'
+    BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, max_statements: int = 1000, track_bytes: bool = True):
+        self.max_statements = max_statements
+        self.track_bytes = track_bytes
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._lock = threading.Lock()
+
+    def _new_shard(self) -> _Shard:
+        shard = self._local.shard = _Shard()
+        with self._lock:
+            self._shards.append(shard)
+        return shard
+
+    def after_execute(self, event: QueryEvent) -> None:
+        shard = self._local.__dict__.get('shard') or self._new_shard()
+        key = fingerprint(event.query)
+        stats = shard.statements.get(key)
+        if stats is None:
+            if len(shard.statements) >= self.max_statements:
+                key = self.OTHER
+            stats = shard.statements.get(key)
+            if stats is None:
+                stats = shard.statements[key] = _StatementStats()
+        stats.latency.record(event.duration)
+        stats.rows += event.rows
+        if self.track_bytes and event.result:
+            stats.bytes += _result_bytes(event.result)
+        if event.error is not None:
+            stats.errors += 1
+        if event.wait is not None:
+            shard.wait.record(event.wait)
+
+    def reset(self) -> None:
+        with self._lock:
+            for shard in self._shards:
+                shard.statements = {}
+                shard.wait = LatencyHistogram()
+
+    def _merged(self) -> Tuple[Dict[str, _StatementStats], LatencyHistogram]:
+        statements: Dict[str, _StatementStats] = {}
+        wait = LatencyHistogram()
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for key, stats in list(shard.statements.items()):
+                merged = statements.get(key)
+                if merged is None:
+                    merged = statements[key] = _StatementStats()
+                merged.latency.merge(stats.latency)
+                merged.rows += stats.rows
+                merged.bytes += stats.bytes
+                merged.errors += stats.errors
+            wait.merge(shard.wait)
+        return statements, wait
+
+    def snapshot(self) -> Dict:
+        """
+        Returns:
+            {
+                "statements": {
+                    "SELECT * FROM users WHERE id = ?": {
+                        "count": 120, "errors": 0, "rows": 118, "bytes": 20480,
+                        "sum": 0.084, "max": 0.0031, "p50": 0.00056, "p95": 0.0012, "p99": 0.0028
+                    }
+                },
+                "connection_wait": {"count": 120, "sum": 0.002, "max": 0.0004, "p50": ..., ...}
+            }
+        """
+        statements, wait = self._merged()
+        return {
+            'statements': {
+                key: dict(stats.latency.summary(), errors=stats.errors, rows=stats.rows, bytes=stats.bytes)
+                for key, stats in statements.items()
+            },
+            'connection_wait': wait.summary(),
+        }
+
+    def render_prometheus(self, prefix: str = 'db') -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        bounds = self.BUCKETS
+        lines = [
+            f"# HELP {prefix}_query_duration_seconds Statement execution time, after connection checkout.",
+            f"# TYPE {prefix}_query_duration_seconds histogram",
+        ]
+        statements, wait = self._merged()
+        counters = {'rows': [], 'bytes': [], 'errors': []}
+        for key, stats in statements.items():
+            label = f'statement="{_label(key)}"'
+            for bound, count in zip(bounds, stats.latency.cumulative(bounds)):
+                lines.append(f'{prefix}_query_duration_seconds_bucket{{{label},le="{bound}"}} {count}')
+            lines.append(f'{prefix}_query_duration_seconds_bucket{{{label},le="+Inf"}} {stats.latency.count}')
+            lines.append(f'{prefix}_query_duration_seconds_sum{{{label}}} {stats.latency.total}')
+            lines.append(f'{prefix}_query_duration_seconds_count{{{label}}} {stats.latency.count}')
+            counters['rows'].append(f'{prefix}_query_rows_total{{{label}}} {stats.rows}')
+            counters['bytes'].append(f'{prefix}_query_bytes_total{{{label}}} {stats.bytes}')
+            counters['errors'].append(f'{prefix}_query_errors_total{{{label}}} {stats.errors}')
+
+        descriptions = {
+            'rows': 'Rows fetched or affected.',
+            'bytes': 'Approximate bytes of fetched rows.',
+            'errors': 'Statements that raised.',
+        }
+        for name, samples in counters.items():
+            lines.append(f"# HELP {prefix}_query_{name}_total {descriptions[name]}")
+            lines.append(f"# TYPE {prefix}_query_{name}_total counter")
+            lines.extend(samples)
+
+        lines.append(f"# HELP {prefix}_connection_wait_seconds Time spent checking out a connection.")
+        lines.append(f"# TYPE {prefix}_connection_wait_seconds histogram")
+        for bound, count in zip(bounds, wait.cumulative(bounds)):
+            lines.append(f'{prefix}_connection_wait_seconds_bucket{{le="{bound}"}} {count}')
+        lines.append(f'{prefix}_connection_wait_seconds_bucket{{le="+Inf"}} {wait.count}')
+        lines.append(f'{prefix}_connection_wait_seconds_sum {wait.total}')
+        lines.append(f'{prefix}_connection_wait_seconds_count {wait.count}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,178 @@
+"""
+Request coalescing for point lookups (the DataLoader pattern).
+
+Instead of one SELECT per id, keys requested by concurrent callers are collected
+for a short window (or, for asyncio, until the end of the current loop tick) and
+fetched with a single `WHERE key IN (...)` query. Each caller gets its own row back.
+"""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Hashable, Iterable, List, Optional
+
+from database import DatabaseConnection
+
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+logger = logging.getLogger(__name__)
+
+
+def _padded(keys: List) -> List:
+    """Pad to the next power of two by repeating the last key, so IN lists share a few SQL templates."""
+    size = 1
+    while size < len(keys):
+        size *= 2
+    return keys + [keys[-1]] * (size - len(keys))
+
+
+class BatchLoader:
+    """
+    Coalesces lookups of single rows by key on top of DatabaseConnection.select().
+
+    The first caller of a batch runs one query per `max_batch` distinct keys.
+    While another batch is still being fetched, which only happens under
+    concurrent load, it first waits `window` seconds for other threads to add
+    their keys; a lone caller is dispatched at once and pays no extra latency.
+    Repeated keys are fetched once. Missing rows resolve to None.
+    """
+
+    def __init__(self, db: DatabaseConnection, table: str, key: str = 'id', columns: str = '*',
+                 database: Optional[str] = None, window: float = 0.002, max_batch: int = 500):
+        self.db = db
+        self.table = table
+        self.key = key
+        self.columns = columns
+        self.database = database
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: Dict[Hashable, Future] = {}
+        self._scheduled = False
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def load(self, key: Hashable) -> Optional[Dict]:
+        return self.load_many([key])[0]
+
+    def load_many(self, keys: Iterable[Hashable]) -> List[Optional[Dict]]:
+        futures = []
+        leader = False
+        with self._lock:
+            for key in keys:
+                future = self._pending.get(key)
+                if future is None:
+                    future = self._pending[key] = Future()
+                futures.append(future)
+            if self._pending and not self._scheduled:
+                self._scheduled = leader = True
+                wait = self.window > 0 and self._in_flight > 0
+
+        if leader:
+            try:
+                if wait:
+                    time.sleep(self.window)
+            finally:
+                # Even when interrupted, so followers sharing the batch don't wait forever
+                self._dispatch()
+        return [future.result() for future in futures]
+
+    def _dispatch(self) -> None:
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            self._scheduled = False
+            self._in_flight += 1
+
+        keys = list(batch)
+        try:
+            for start in range(0, len(keys), self.max_batch):
+                chunk = keys[start:start + self.max_batch]
+                try:
+                    rows = self._fetch(chunk)
+                except Exception as err:
+                    for key in chunk:
+                        batch[key].set_exception(err)
+                    continue
+                for key in chunk:
+                    batch[key].set_result(rows.get(key))
+        except BaseException as err:
+            # Interrupted (KeyboardInterrupt, SystemExit): fail the keys left unresolved,
+            # with an ordinary error, since the interrupt belongs to the leader's thread
+            failure = RuntimeError(f"Batch load of {self.table} was interrupted: {err!r}")
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(failure)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _fetch(self, keys: List) -> Dict:
+        params = _padded(keys)
+        placeholders = ', '.join(['%s'] * len(params))
+        rows = self.db.select(self.table, self.columns, where=f"{self.key} IN ({placeholders})",
+                              params=params, database=self.database)
+        logger.debug(f"Loaded {len(rows)} {self.table} rows for {len(keys)} keys")
+        column = self.key.split('.')[-1]
+        return {row[column]: row for row in rows}
+
+
+class AsyncBatchLoader:
+    """
+    BatchLoader for AsyncDatabaseConnection: keys requested during one event loop
+    tick are fetched together once the tick ends.
+    """
+
+    def __init__(self, db, table: str, key: str = 'id', columns: str = '*',
+                 database: Optional[str] = None, max_batch: int = 500):
+        self.db = db
+        self.table = table
+        self.key = key
+        self.columns = columns
+        self.database = database
+        self.max_batch = max_batch
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+        self._tasks: set = set()
+
+    async def load(self, key: Hashable) -> Optional[Dict]:
+        return (await self.load_many([key]))[0]
+
+    async def load_many(self, keys: Iterable[Hashable]) -> List[Optional[Dict]]:
+        loop = asyncio.get_running_loop()
+        futures = []
+        for key in keys:
+            future = self._pending.get(key)
+            if future is None:
+                if not self._pending:
+                    loop.call_soon(self._start_dispatch)
+                future = self._pending[key] = loop.create_future()
+            futures.append(future)
+        # Shielded: one caller being cancelled must not cancel a key other callers share
+        return list(await asyncio.gather(*(asyncio.shield(future) for future in futures)))
+
+    def _start_dispatch(self) -> None:
+        task = asyncio.ensure_future(self._dispatch())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self) -> None:
+        batch, self._pending = self._pending, {}
+        keys = list(batch)
+        chunks = [keys[start:start + self.max_batch] for start in range(0, len(keys), self.max_batch)]
+        results = await asyncio.gather(*(self._fetch(chunk) for chunk in chunks), return_exceptions=True)
+        for chunk, rows in zip(chunks, results):
+            for key in chunk:
+                if batch[key].done():
+                    continue
+                if isinstance(rows, BaseException):
+                    batch[key].set_exception(rows)
+                else:
+                    batch[key].set_result(rows.get(key))
+
+    async def _fetch(self, keys: List) -> Dict:
+        params = _padded(keys)
+        placeholders = ', '.join(['%s'] * len(params))
+        rows = await self.db.select(self.table, self.columns, where=f"{self.key} IN ({placeholders})",
+                                    params=params, database=self.database)
+        logger.debug(f"Loaded {len(rows)} {self.table} rows for {len(keys)} keys")
+        column = self.key.split('.')[-1]
+        return {row[column]: row for row in rows}
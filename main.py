@@ -97,6 +97,12 @@ def run_demo():
     except Exception as e:
         print(f"Transaction rolled back: {e}")
 
+    print("\n--- Transaction (helpers share one connection, commit once) ---")
+    with db.transaction(database=TEST_DB):
+        db.update(TEST_TABLE, {'name': 'Alice'}, 'id = %s', [user_id], database=TEST_DB)
+        db.insert(TEST_TABLE, {'name': 'Frank', 'email': 'frank@example.com'}, database=TEST_DB)
+    print(f"Users after transaction: {db.count(TEST_TABLE, database=TEST_DB)}")
+
     print("\n--- Table info ---")
     info = db.get_table_info(TEST_TABLE, database=TEST_DB)
     for col in info:
@@ -0,0 +1,126 @@
+"""
+N+1 query detection for development and test runs.
+
+Inside a detection scope (DatabaseConnection.detect_n_plus_one(), one per
+request or test) every statement is counted by fingerprint. A template that
+runs `threshold` or more times with different parameters, which is the shape
+of get_user_by_id() called in a loop, is reported once the scope ends,
+together with the application call stack that issued it. Scopes can raise
+NPlusOneError instead, so regressions fail local test runs.
+"""
+import logging
+import os
+import traceback
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+from instrumentation import QueryEvent, QueryHook, fingerprint
+
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+logger = logging.getLogger(__name__)
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+# Library frames are dropped from reported stacks; they are the same for every N+1
+_LIBRARY_FILES = {os.path.join(_HERE, name) for name in (
+    'database.py', 'async_database.py', 'instrumentation.py', 'nplusone.py', 'slowlog.py',
+    'records.py', 'sharding.py', 'loaders.py')}
+_MAX_TRACKED_PARAMS = 1000
+
+
+class NPlusOneError(Exception):
+    """Raised when a detection scope created with raise_on_detect=True ends with findings."""
+
+    def __init__(self, findings: List[Dict]):
+        self.findings = findings
+        super().__init__(_describe(findings))
+
+
+def _describe(findings: List[Dict]) -> str:
+    parts = [f"{len(findings)} repeated statement(s) look like N+1 queries:"]
+    for finding in findings:
+        parts.append(f"\n  {finding['count']}x ({finding['distinct_params']} distinct params) "
+                     f"{finding['fingerprint']}\n  issued from:\n{finding['stack']}")
+    return ''.join(parts)
+
+
+def _application_stack() -> str:
+    frames = [frame for frame in traceback.extract_stack()[:-1]
+              if os.path.abspath(frame.filename) not in _LIBRARY_FILES]
+    return ''.join(traceback.format_list(frames[-8:]))
+
+
+class _Statement:
+    __slots__ = ('count', 'params', 'stack')
+
+    def __init__(self):
+        self.count = 0
+        self.params = set()
+        self.stack: Optional[str] = None
+
+
+class DetectionScope:
+    """Statements seen in one scope; findings() lists the N+1 candidates so far."""
+
+    def __init__(self, threshold: int):
+        self.threshold = threshold
+        self.statements: Dict[str, _Statement] = {}
+
+    def record(self, event: QueryEvent) -> None:
+        key = fingerprint(event.query)
+        statement = self.statements.get(key)
+        if statement is None:
+            statement = self.statements[key] = _Statement()
+        statement.count += 1
+        if len(statement.params) < _MAX_TRACKED_PARAMS:
+            try:
+                statement.params.add(event.params)
+            except TypeError:
+                statement.params.add(repr(event.params))
+        # The stack is taken once, when the template first crosses the threshold
+        if statement.stack is None and len(statement.params) >= self.threshold:
+            statement.stack = _application_stack()
+
+    def findings(self) -> List[Dict]:
+        return [
+            {'fingerprint': key, 'count': statement.count,
+             'distinct_params': len(statement.params), 'stack': statement.stack}
+            for key, statement in self.statements.items() if statement.stack is not None
+        ]
+
+
+class NPlusOneDetector(QueryHook):
+    """
+    Query hook that feeds the active DetectionScope of the current thread or asyncio task.
+
+    Args:
+        threshold: distinct parameter sets of one template that count as N+1.
+        raise_on_detect: raise NPlusOneError when a scope ends with findings, instead of logging.
+    """
+
+    def __init__(self, threshold: int = 5, raise_on_detect: bool = False):
+        self.threshold = threshold
+        self.raise_on_detect = raise_on_detect
+        self._scope: ContextVar[Optional[DetectionScope]] = ContextVar(f"n_plus_one_scope_{id(self)}",
+                                                                      default=None)
+
+    def after_execute(self, event: QueryEvent) -> None:
+        scope = self._scope.get()
+        if scope is not None:
+            scope.record(event)
+
+    @contextmanager
+    def scope(self, threshold: Optional[int] = None,
+              raise_on_detect: Optional[bool] = None) -> Iterator[DetectionScope]:
+        scope = DetectionScope(self.threshold if threshold is None else threshold)
+        token = self._scope.set(scope)
+        try:
+            yield scope
+        finally:
+            self._scope.reset(token)
+        findings = scope.findings()
+        if not findings:
+            return
+        if self.raise_on_detect if raise_on_detect is None else raise_on_detect:
+            raise NPlusOneError(findings)
+        logger.warning(_describe(findings))
@@ -3,11 +3,17 @@ Example query functions built on top of DatabaseConnection.
 
 These show common patterns: filtering, joining, aggregating, and pagination.
 """
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional
 from database import DatabaseConnection
+from loaders import BatchLoader
 
 db = DatabaseConnection()
 
+# Point lookups from concurrent callers are coalesced into one WHERE id IN (...) query
+users_by_id = BatchLoader(db, 'users')
+orders_by_id = BatchLoader(db, 'orders')
+products_by_id = BatchLoader(db, 'products')
+
 
 # ---------------------------------------------------------------------------
 # Users
@@ -18,6 +24,16 @@ def get_user_by_id(user_id: int) -> Optional[Dict]:
     return results[0] if results else None
 
 
+def load_user(user_id: int) -> Optional[Dict]:
+    """Like get_user_by_id, but batched with concurrent lookups from other threads."""
+    return users_by_id.load(user_id)
+
+
+def load_users(user_ids: Iterable[int]) -> List[Optional[Dict]]:
+    """One row (or None) per id, in order, fetched with a single query."""
+    return users_by_id.load_many(user_ids)
+
+
 def get_user_by_email(email: str) -> Optional[Dict]:
     results = db.select('users', where='email = %s', params=[email])
     return results[0] if results else None
@@ -54,6 +70,26 @@ def count_active_users() -> int:
     return db.count('users', 'deleted_at IS NULL')
 
 
+# ---------------------------------------------------------------------------
+# Orders and products (batched point lookups)
+# ---------------------------------------------------------------------------
+
+def load_order(order_id: int) -> Optional[Dict]:
+    return orders_by_id.load(order_id)
+
+
+def load_orders(order_ids: Iterable[int]) -> List[Optional[Dict]]:
+    return orders_by_id.load_many(order_ids)
+
+
+def load_product(product_id: int) -> Optional[Dict]:
+    return products_by_id.load(product_id)
+
+
+def load_products(product_ids: Iterable[int]) -> List[Optional[Dict]]:
+    return products_by_id.load_many(product_ids)
+
+
 # ---------------------------------------------------------------------------
 # Users + Orders (JOIN example)
 # ---------------------------------------------------------------------------
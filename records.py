@@ -0,0 +1,76 @@
+"""
+Compact, tuple-backed result rows.
+
+A dict row repeats every column name and carries a hash table; a Record is a
+plain tuple of the values whose class holds the column names once for every
+row of the same result shape. Rows read like dicts (row["name"], row.get(),
+keys(), items()) and like named tuples (row.name, row[0]).
+"""
+from collections import namedtuple
+from functools import lru_cache
+from typing import Dict, List, Sequence, Tuple
+
+
+class Record(tuple):
+    """
+    Base class of the generated row classes. Iteration, len() and `in` behave
+    like the tuple of values; use keys() for column names.
+    """
+    __slots__ = ()
+    _columns: Tuple[str, ...] = ()
+    _index: Dict[str, int] = {}
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                key = self._index[key]
+            except KeyError:
+                raise KeyError(key) from None
+        return tuple.__getitem__(self, key)
+
+    def get(self, key: str, default=None):
+        index = self._index.get(key)
+        return default if index is None else tuple.__getitem__(self, index)
+
+    def keys(self) -> Tuple[str, ...]:
+        return self._columns
+
+    def items(self) -> List[Tuple[str, object]]:
+        return list(zip(self._columns, self))
+
+    def as_dict(self) -> Dict:
+        return dict(zip(self._columns, self))
+
+    def __repr__(self) -> str:
+        return f"Record({', '.join(f'{name}={value!r}' for name, value in zip(self._columns, self))})"
+
+    def __reduce__(self):
+        # Generated classes can't be found by name, so pickle via the column names (e.g. for process pools)
+        return _rebuild, (self._columns, tuple(self))
+
+
+def _rebuild(columns: Tuple[str, ...], values: Tuple) -> Record:
+    return tuple.__new__(record_class(columns), values)
+
+
+@lru_cache(maxsize=1024)
+def record_class(columns: Tuple[str, ...]) -> type:
+    """The Record subclass for one result shape, created once per distinct column list."""
+    # Column names that aren't identifiers (COUNT(*)) are reachable by key only. For
+    # repeated names (joins) the last one wins, as with dictionary cursors
+    attributes = list(columns)
+    seen = set()
+    for position in reversed(range(len(attributes))):
+        if attributes[position] in seen:
+            attributes[position] = ''
+        seen.add(columns[position])
+    fields = namedtuple('RecordFields', attributes, rename=True)
+    index = {name: position for position, name in enumerate(columns)}
+    return type('Record', (Record, fields), {'__slots__': (), '_columns': columns, '_index': index})
+
+
+def make_records(description: Sequence[Sequence], rows: List[Tuple]) -> List[Record]:
+    """Wrap tuple rows from a cursor in the Record class for its description."""
+    cls = record_class(tuple(column[0] for column in description))
+    new = tuple.__new__
+    return [new(cls, row) for row in rows]
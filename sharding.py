@@ -0,0 +1,248 @@
+"""
+Horizontal sharding over several DatabaseConnection instances.
+
+Each sharded table names a shard key column. Calls that carry a shard key value
+(inserts always do, through their records) run on the one shard that owns it;
+calls without one are scattered to every shard in parallel and the results are
+gathered: rows are k-way merged on order_by and cut to limit/offset, counts and
+affected-row totals are summed.
+"""
+import bisect
+import heapq
+import logging
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from functools import cmp_to_key
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Union
+
+from database import DatabaseConfig, DatabaseConnection, _parse_order_by
+
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+logger = logging.getLogger(__name__)
+
+
+def _order_terms(order_by: str) -> List:
+    return [(column.split('.')[-1].strip('`'), descending) for column, descending in _parse_order_by(order_by)]
+
+
+def _check_merge_keys(results: List[List[Dict]], order_by: str) -> None:
+    """
+    Shards sort strings by their column collation (case- and accent-insensitive
+    under utf8mb4_0900_ai_ci), which Python comparison can't reproduce, so a
+    merge on string values could cut the wrong rows. Only numbers, temporals and
+    binary values are merged.
+    """
+    columns = [column for column, _ in _order_terms(order_by)]
+    for result in results:
+        for row in result:
+            for column in columns:
+                if isinstance(row[column], str):
+                    raise ValueError(f"Can't merge sharded results on text column {column!r}: shards sort it by "
+                                     f"collation. Order by a numeric or temporal column, or pass shard_key")
+
+
+def _row_comparator(order_by: str) -> Callable:
+    """Compare two dict rows like ORDER BY would; NULLs sort first ascending, as in MySQL."""
+    terms = _order_terms(order_by)
+
+    def compare(a: Dict, b: Dict) -> int:
+        for column, descending in terms:
+            x, y = a[column], b[column]
+            if x == y:
+                continue
+            if x is None:
+                result = -1
+            elif y is None:
+                result = 1
+            else:
+                result = -1 if x < y else 1
+            return -result if descending else result
+        return 0
+
+    return compare
+
+
+class ShardedDatabase:
+    """
+    Routes insert/select/update/delete/count/exists to shards by a per-table shard key.
+
+    "hash" places a key on shard crc32(str(key)) % len(shards), which is stable
+    across processes. "range" takes ascending boundaries, one fewer than there are
+    shards: shard i holds keys below boundaries[i], the last shard everything else.
+
+    AUTO_INCREMENT ids are generated per shard and collide across them, so shard
+    key values should come from the application.
+    """
+
+    STRATEGIES = ('hash', 'range')
+
+    def __init__(self, shards: Sequence[DatabaseConnection], shard_keys: Dict[str, str],
+                 strategy: str = 'hash', boundaries: Optional[Sequence] = None):
+        """
+        Args:
+            shards: one DatabaseConnection per shard, in shard order.
+            shard_keys: shard key column per table, e.g. {"users": "id", "orders": "user_id"}.
+            strategy: "hash" or "range".
+            boundaries: for "range", the ascending upper bounds (exclusive) of every shard but the last.
+        """
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"strategy must be one of {self.STRATEGIES}, got {strategy!r}")
+        if not shards:
+            raise ValueError("At least one shard is required")
+        if strategy == 'range':
+            boundaries = list(boundaries or [])
+            if len(boundaries) != len(shards) - 1:
+                raise ValueError(f"range sharding over {len(shards)} shards needs {len(shards) - 1} boundaries")
+            if boundaries != sorted(boundaries):
+                raise ValueError("range boundaries must be ascending")
+        self.shards = list(shards)
+        self.shard_keys = dict(shard_keys)
+        self.strategy = strategy
+        self.boundaries = boundaries
+        self._executor = ThreadPoolExecutor(max_workers=len(self.shards), thread_name_prefix="db_shard")
+
+    @classmethod
+    def from_hosts(cls, shard_keys: Dict[str, str], hosts: Optional[Sequence[str]] = None,
+                   strategy: str = 'hash', boundaries: Optional[Sequence] = None,
+                   **options) -> 'ShardedDatabase':
+        """
+        One DatabaseConnection per host, sharing DB_USER/DB_PASSWORD/DB_NAME.
+
+        Args:
+            hosts: "host[:port]" entries; defaults to DB_SHARD_HOSTS.
+            options: passed to every DatabaseConnection, e.g. cache_size=1000.
+        """
+        if hosts is None:
+            addresses = DatabaseConfig().shard_hosts
+        else:
+            addresses = [(host, port) for host, port, _ in DatabaseConfig._parse_hosts(','.join(hosts))]
+        if not addresses:
+            raise ValueError("No shard hosts given and DB_SHARD_HOSTS is empty")
+        shards = [DatabaseConnection(host=host, port=port, **options) for host, port in addresses]
+        return cls(shards, shard_keys, strategy, boundaries)
+
+    def shard_index(self, key: Hashable) -> int:
+        if key is None:
+            raise ValueError("Shard key value must not be None")
+        if self.strategy == 'range':
+            return bisect.bisect_right(self.boundaries, key)
+        return zlib.crc32(str(key).encode('utf-8')) % len(self.shards)
+
+    def shard_for(self, key: Hashable) -> DatabaseConnection:
+        """The shard owning this key value, for calls ShardedDatabase doesn't wrap (e.g. transaction())."""
+        return self.shards[self.shard_index(key)]
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        for shard in self.shards:
+            shard.close()
+
+    def _shard_column(self, table: str) -> str:
+        column = self.shard_keys.get(table.split()[0])
+        if column is None:
+            raise ValueError(f"No shard key configured for table '{table}'")
+        return column
+
+    def _scatter(self, method: str, *args, **kwargs) -> List:
+        """Run the same DatabaseConnection method on every shard in parallel; results in shard order."""
+        # One context copy per task: a Context can only be entered by one thread at a time
+        futures = [self._executor.submit(copy_context().run, getattr(shard, method), *args, **kwargs)
+                   for shard in self.shards]
+        return [future.result() for future in futures]
+
+    def insert(self, table: str, data: Union[Dict, List[Dict]],
+               database: Optional[str] = None, on_duplicate: Optional[str] = None) -> int:
+        """
+        Every record must carry the table's shard key column. Returns the last insert ID
+        for a single record, otherwise the number of rows written across shards.
+        """
+        column = self._shard_column(table)
+        if isinstance(data, dict):
+            return self.shard_for(data.get(column)).insert(table, data, database, on_duplicate)
+        if not data:
+            return 0
+
+        groups: Dict[int, List[Dict]] = {}
+        for record in data:
+            groups.setdefault(self.shard_index(record.get(column)), []).append(record)
+        futures = [self._executor.submit(copy_context().run, self.shards[index].insert_many,
+                                         table, records, database, on_duplicate)
+                   for index, records in groups.items()]
+        rows = sum(future.result()['rows'] for future in futures)
+        logger.debug(f"Sharded insert of {rows} rows into {table} across {len(groups)} shard(s)")
+        return rows
+
+    def upsert(self, table: str, data: Dict, update_fields: Optional[List[str]] = None,
+               database: Optional[str] = None) -> int:
+        return self.shard_for(data.get(self._shard_column(table))).upsert(table, data, update_fields, database)
+
+    def select(self, table: str, columns: str = "*", where: Optional[str] = None,
+               params: Optional[List] = None, order_by: Optional[str] = None,
+               limit: Optional[int] = None, offset: Optional[int] = None,
+               database: Optional[str] = None, dictionary: bool = True,
+               joins: Optional[Union[str, List[str]]] = None,
+               shard_key: Optional[Hashable] = None) -> List:
+        """
+        Same arguments as DatabaseConnection.select(), plus shard_key.
+
+        With shard_key the query runs on that shard only. Without it every shard
+        returns up to offset + limit rows, which are merged on order_by (dictionary
+        rows with the order_by columns selected) and then cut to the requested page.
+        The order_by columns must hold numbers, dates/times or binary values: text is
+        sorted by collation on the shards, so merging on it raises ValueError.
+        Joins only see rows on the same shard.
+        """
+        if shard_key is not None:
+            return self.shard_for(shard_key).select(table, columns, where, params, order_by, limit, offset,
+                                                    database, dictionary, joins)
+        if order_by and not dictionary:
+            raise ValueError("Merging sharded results on order_by needs dictionary=True")
+
+        shard_limit = None if limit is None else limit + (offset or 0)
+        results = self._scatter('select', table, columns, where, params, order_by, shard_limit, None,
+                                database, dictionary, joins)
+        if order_by:
+            _check_merge_keys(results, order_by)
+            rows = heapq.merge(*results, key=cmp_to_key(_row_comparator(order_by)))
+        else:
+            rows = (row for result in results for row in result)
+
+        start = offset or 0
+        stop = None if limit is None else start + limit
+        merged = []
+        for position, row in enumerate(rows):
+            if stop is not None and position >= stop:
+                break
+            if position >= start:
+                merged.append(row)
+        return merged
+
+    def update(self, table: str, data: Dict, where: str, params: Optional[List] = None,
+               database: Optional[str] = None, shard_key: Optional[Hashable] = None) -> int:
+        """Without shard_key the update runs on every shard; returns the total affected rows."""
+        if self._shard_column(table) in data:
+            raise ValueError("Updating the shard key column would leave rows on the wrong shard")
+        if shard_key is not None:
+            return self.shard_for(shard_key).update(table, data, where, params, database)
+        return sum(self._scatter('update', table, data, where, params, database))
+
+    def delete(self, table: str, where: str, params: Optional[List] = None,
+               database: Optional[str] = None, soft: bool = False,
+               shard_key: Optional[Hashable] = None) -> int:
+        """Without shard_key the delete runs on every shard; returns the total affected rows."""
+        if shard_key is not None:
+            return self.shard_for(shard_key).delete(table, where, params, database, soft)
+        return sum(self._scatter('delete', table, where, params, database, soft))
+
+    def count(self, table: str, where: Optional[str] = None, params: Optional[List] = None,
+              database: Optional[str] = None, shard_key: Optional[Hashable] = None) -> int:
+        if shard_key is not None:
+            return self.shard_for(shard_key).count(table, where, params, database)
+        return sum(self._scatter('count', table, where, params, database))
+
+    def exists(self, table: str, where: str, params: Optional[List] = None,
+               database: Optional[str] = None, shard_key: Optional[Hashable] = None) -> bool:
+        if shard_key is not None:
+            return self.shard_for(shard_key).exists(table, where, params, database)
+        return any(self._scatter('exists', table, where, params, database))
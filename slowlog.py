@@ -0,0 +1,159 @@
+"""
+Client-side slow-query log.
+
+SlowQueryLog is a QueryHook: every statement slower than the threshold is
+recorded with its fingerprint, parameter shape, timings and row count. SELECTs
+are then explained (EXPLAIN FORMAT=JSON) on a background thread, at most once
+per fingerprint per explain_interval, and tables the plan reads with a full
+scan are listed. Entries go to a bounded in-memory ring buffer and, optionally,
+one JSON object per line to a file.
+"""
+import datetime
+import json
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from instrumentation import QueryEvent, QueryHook, fingerprint
+
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+logger = logging.getLogger(__name__)
+
+
+def _params_shape(params) -> List[str]:
+    """Type names of the parameters, runs collapsed: (1, 2, 3, 'a') -> ["int*3", "str"]."""
+    if not params:
+        return []
+    if isinstance(params, dict):
+        return [f"{name}:{type(value).__name__}" for name, value in params.items()]
+    if isinstance(params, list) and params and isinstance(params[0], (tuple, list)):
+        # execute_many(): one tuple per row
+        return [f"rows*{len(params)}"] + _params_shape(params[0])
+    shape = []
+    previous, run = None, 0
+    for value in params:
+        name = type(value).__name__
+        if name == previous:
+            run += 1
+            continue
+        if previous is not None:
+            shape.append(previous if run == 1 else f"{previous}*{run}")
+        previous, run = name, 1
+    shape.append(previous if run == 1 else f"{previous}*{run}")
+    return shape
+
+
+def _full_scans(plan) -> List[str]:
+    """Tables an EXPLAIN FORMAT=JSON plan reads with access_type ALL."""
+    tables = []
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if node.get('access_type') == 'ALL' and 'table_name' in node:
+                tables.append(node['table_name'])
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+    return tables
+
+
+class SlowQueryLog(QueryHook):
+    """
+    Args:
+        threshold: seconds of execution (after connection checkout) that make a statement slow.
+        path: JSONL file that every entry is appended to; None keeps them in memory only.
+        explain: callable(query, params, database) -> parsed EXPLAIN FORMAT=JSON plan.
+                 DatabaseConnection passes one that uses its own pooled connection.
+        max_entries: size of the in-memory ring buffer.
+        explain_interval: seconds between EXPLAINs of the same fingerprint.
+    """
+
+    def __init__(self, threshold: float, path: Optional[str] = None,
+                 explain: Optional[Callable[[str, object, Optional[str]], Dict]] = None,
+                 max_entries: int = 1000, explain_interval: float = 60.0):
+        self.threshold = threshold
+        self.path = path
+        self.explain = explain
+        self.explain_interval = explain_interval
+        self._entries: deque = deque(maxlen=max_entries)
+        self._last_explained: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def after_execute(self, event: QueryEvent) -> None:
+        if event.duration < self.threshold:
+            return
+        key = fingerprint(event.query)
+        entry = {
+            'time': datetime.datetime.now().isoformat(timespec='milliseconds'),
+            'fingerprint': key,
+            'params_shape': _params_shape(event.params),
+            'duration': round(event.duration, 6),
+            'wait': None if event.wait is None else round(event.wait, 6),
+            'rows': event.rows,
+            'database': event.database,
+            'error': None if event.error is None else repr(event.error),
+        }
+        with self._lock:
+            self._entries.append(entry)
+            now = time.monotonic()
+            explain = (self.explain is not None and event.error is None
+                       and event.query.lstrip()[:6].upper() == 'SELECT'
+                       and now - self._last_explained.get(key, float('-inf')) >= self.explain_interval)
+            executor = None
+            if explain:
+                self._last_explained[key] = now
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db_explain")
+                executor = self._executor
+        logger.warning(f"Slow query ({event.duration * 1000:.1f} ms, {event.rows} rows): {key}")
+
+        if executor is not None:
+            # The caller already waited long enough; the plan is fetched off its thread
+            executor.submit(self._explain, entry, event.query, event.params, event.database)
+        else:
+            self._write(entry)
+
+    def _explain(self, entry: Dict, query: str, params, database: Optional[str]) -> None:
+        try:
+            plan = self.explain(query, params, database)
+            entry['explain'] = plan
+            entry['full_scans'] = _full_scans(plan)
+        except Exception as err:
+            entry['explain_error'] = repr(err)
+        self._write(entry)
+
+    def _write(self, entry: Dict) -> None:
+        if self.path is None:
+            return
+        line = json.dumps(entry, default=str)
+        try:
+            with self._file_lock, open(self.path, 'a', encoding='utf-8') as handle:
+                handle.write(line + '\n')
+        except OSError as err:
+            logger.error(f"Could not write slow query log {self.path}: {err}")
+
+    def entries(self, fingerprint_filter: Optional[str] = None) -> List[Dict]:
+        """The buffered entries, oldest first; optionally only those whose fingerprint contains the filter."""
+        with self._lock:
+            entries = list(self._entries)
+        if fingerprint_filter:
+            return [entry for entry in entries if fingerprint_filter in entry['fingerprint']]
+        return entries
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._last_explained.clear()
+
+    def close(self) -> None:
+        """Wait for pending EXPLAINs and stop the background thread."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)